@@ -1,14 +1,13 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import os
-from dotenv import load_dotenv
-import matplotlib.pyplot as plt
-import seaborn as sns
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from artifacts import EngineHandle
+from engine import load_engine, mood_mapping
+
+# Heavy, page-specific libraries (spotipy, matplotlib, seaborn) are imported
+# inside the page that needs them, so a rerun only pays for the active page.
 
 # Page configuration
 st.set_page_config(
@@ -35,54 +34,37 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# Load environment variables
-client_id = None
-client_secret = None
-
-# Try Streamlit secrets first
-try:
-    client_id = st.secrets.get("SPOTIFY_CLIENT_ID")
-    client_secret = st.secrets.get("SPOTIFY_CLIENT_SECRET")
-except:
-    pass
-
-# Fall back to .env file
-if not client_id or not client_secret:
-    load_dotenv("file.env")
-    client_id = os.getenv("SPOTIFY_CLIENT_ID")
-    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-
-# Load dataset
-@st.cache_data
-def load_data():
-    df = pd.read_csv("dataset.csv")
-    df = df[[
-        "track_name",
-        "artists",
-        "track_genre",
-        "popularity",
-        "danceability",
-        "energy",
-        "tempo",
-        "valence"
-    ]]
-    df.columns = ["song", "artist", "genre", "popularity", "danceability", "energy", "tempo", "valence"]
-    df.dropna(inplace=True)
-    df = df[df["popularity"] >= 50]
-    df.reset_index(drop=True, inplace=True)
-    df["song_clean"] = df["song"].str.lower().str.strip()
-    return df
+# Spotify credentials are only needed on the Spotify page
+@st.cache_resource
+def get_spotify_credentials():
+    client_id = None
+    client_secret = None
 
+    # Try Streamlit secrets first
+    try:
+        client_id = st.secrets.get("SPOTIFY_CLIENT_ID")
+        client_secret = st.secrets.get("SPOTIFY_CLIENT_SECRET")
+    except:
+        pass
+
+    # Fall back to .env file
+    if not client_id or not client_secret:
+        from dotenv import load_dotenv
+        load_dotenv("file.env")
+        client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+    return client_id, client_secret
+
+# Dataset, scaler and lookup tables are built once per process
 @st.cache_resource
-def get_scaler_and_features(df):
-    features = df[["danceability", "energy", "tempo", "valence"]]
-    scaler = StandardScaler()
-    scaled_features = scaler.fit_transform(features)
-    return scaler, scaled_features
+def get_engine():
+    # Prefer the memory-mapped index (python cli.py build-index) so that
+    # several app processes share one copy of the catalogue. The handle
+    # switches to a newly built version in the background; each rerun takes
+    # one engine and uses it throughout.
+    return EngineHandle("index", lambda path: load_engine(path, "dataset.csv"))
 
-# Load data
-df = load_data()
-scaler, scaled_features = get_scaler_and_features(df)
+engine = get_engine().engine
 
 # Header
 col1, col2, col3 = st.columns([1, 2, 1])
@@ -112,43 +94,44 @@ if page == "🔎 Song-to-Song":
     with col1:
         song_input = st.selectbox(
             "Select a song or type to search:",
-            df["song"].unique(),
+            engine.song_options,
             key="song_search"
         )
     with col2:
         n_recommendations = st.number_input("Number of recommendations", min_value=1, max_value=20, value=5)
     
     if st.button("🔍 Find Similar Songs", key="btn_similar"):
-        song_name = song_input.lower().strip()
-        
-        if song_name not in df["song_clean"].values:
-            st.error(f"❌ Song '{song_input}' not found in dataset")
+        song_index, recommendations = engine.similar(song_input, n_recommendations)
+        # Keep the song itself rather than its row number, which may point
+        # elsewhere after the index is swapped for a new version
+        st.session_state["similar_result"] = {
+            "query": song_input,
+            "song": None if song_index is None else engine.rows([song_index]).iloc[0],
+            "recommendations": recommendations,
+        }
+    
+    # Results live in session state so they survive unrelated reruns
+    result = st.session_state.get("similar_result")
+    if result is not None:
+        if result["song"] is None:
+            st.error(f"❌ Song '{result['query']}' not found in dataset")
         else:
-            song_index = df[df["song_clean"] == song_name].index[0]
-            similarity_scores = cosine_similarity(
-                scaled_features[song_index].reshape(1, -1),
-                scaled_features
-            )[0]
-            
-            temp_df = df.copy()
-            temp_df["similarity"] = similarity_scores
-            
-            recommendations = temp_df.sort_values("similarity", ascending=False).iloc[1:n_recommendations+1]
+            recommendations = result["recommendations"]
             
             # Display original song
-            orig_song = df.loc[song_index]
+            orig_song = result["song"]
             st.info(f"🎵 **Found:** *{orig_song['song']}* by **{orig_song['artist']}** ({orig_song['genre']})")
             
             # Display recommendations
-            st.subheader(f"✨ Top {n_recommendations} Similar Songs:")
-            for idx, (_, row) in enumerate(recommendations.iterrows(), 1):
-                similarity = row['similarity'] * 100
+            st.subheader(f"✨ Top {len(recommendations)} Similar Songs:")
+            for idx, row in enumerate(recommendations.itertuples(), 1):
+                similarity = row.similarity * 100
                 col1, col2, col3 = st.columns([0.5, 3, 1])
                 with col1:
                     st.metric("", f"#{idx}")
                 with col2:
-                    st.write(f"**{row['song']}** • {row['artist']}")
-                    st.caption(f"📂 {row['genre']} • ⭐ {row['popularity']}/100")
+                    st.write(f"**{row.song}** • {row.artist}")
+                    st.caption(f"📂 {row.genre} • ⭐ {row.popularity}/100")
                 with col3:
                     st.metric("Similarity", f"{similarity:.1f}%")
 
@@ -157,58 +140,149 @@ elif page == "😊 Mood-Based":
     st.header("😊 Mood-Based Recommendations")
     st.markdown("Get song suggestions based on your mood and preferred genre")
     
-    mood_mapping = {
-        "happy": {"energy": 0.8, "valence": 0.9},
-        "sad": {"energy": 0.3, "valence": 0.2},
-        "energetic": {"energy": 0.9, "valence": 0.7},
-        "chill": {"energy": 0.4, "valence": 0.5}
-    }
+    mode = st.radio("Mode:", ["Preset mood", "Mood journey"], horizontal=True, key="mood_mode")
     
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        genre = st.selectbox("Select a genre:", df["genre"].unique())
-    with col2:
-        mood = st.selectbox("Select a mood:", list(mood_mapping.keys()))
-    with col3:
-        n_recommendations = st.number_input("Number of recommendations", min_value=1, max_value=20, value=5, key="mood_n")
+    if mode == "Preset mood":
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            genre = st.selectbox("Select a genre:", engine.genres)
+        with col2:
+            mood = st.selectbox("Select a mood:", list(mood_mapping.keys()))
+        with col3:
+            n_recommendations = st.number_input("Number of recommendations", min_value=1, max_value=20, value=5, key="mood_n")
+    
+        if st.button("🎵 Get Recommendations", key="btn_mood"):
+            st.session_state["mood_result"] = {
+                "genre": genre,
+                "mood": mood,
+                "recommendations": engine.by_mood(genre, mood, n_recommendations),
+            }
+    
+        result = st.session_state.get("mood_result")
+        if result is not None:
+            if result["recommendations"] is None:
+                st.error(f"❌ Genre '{result['genre']}' not found")
+            else:
+                st.success(f"✨ {result['mood'].capitalize()} {result['genre'].capitalize()} Songs:")
+                for idx, row in enumerate(result["recommendations"].itertuples(), 1):
+                    col1, col2 = st.columns([0.3, 3])
+                    with col1:
+                        st.metric("", f"#{idx}")
+                    with col2:
+                        st.write(f"**{row.song}** • {row.artist}")
+                        st.caption(f"⭐ {row.popularity}/100 • 🎵 {row.genre}")
     
-    if st.button("🎵 Get Recommendations", key="btn_mood"):
-        genre_df = df[df["genre"].str.lower() == genre.lower()]
+    else:
+        st.caption("Pick where the playlist starts and ends in mood space; the songs in between move smoothly from one to the other")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("**Start**")
+            start_energy = st.slider("Energy", 0.0, 1.0, 0.4, key="start_energy")
+            start_valence = st.slider("Valence", 0.0, 1.0, 0.5, key="start_valence")
+        with col2:
+            st.markdown("**End**")
+            end_energy = st.slider("Energy", 0.0, 1.0, 0.9, key="end_energy")
+            end_valence = st.slider("Valence", 0.0, 1.0, 0.7, key="end_valence")
+        with col3:
+            journey_genre = st.selectbox("Genre:", ["Any genre"] + list(engine.genres), key="journey_genre")
+            n_tracks = st.number_input("Playlist length", min_value=2, max_value=100, value=20, key="journey_n")
         
-        if genre_df.empty:
-            st.error(f"❌ Genre '{genre}' not found")
-        else:
-            user_vector = [
-                0.5,
-                mood_mapping[mood]["energy"],
-                genre_df["tempo"].mean(),
-                mood_mapping[mood]["valence"]
+        if st.button("🎶 Build Playlist", key="btn_journey"):
+            waypoints = [
+                {"energy": start_energy, "valence": start_valence},
+                {"energy": end_energy, "valence": end_valence},
             ]
-            
-            user_vector_scaled = scaler.transform([user_vector])
-            genre_features = genre_df[["danceability", "energy", "tempo", "valence"]]
-            genre_scaled = scaler.transform(genre_features)
-            
-            similarities = cosine_similarity(user_vector_scaled, genre_scaled)[0]
-            genre_df_copy = genre_df.copy()
-            genre_df_copy["similarity"] = similarities
-            
-            recommendations = genre_df_copy.sort_values("similarity", ascending=False).head(n_recommendations)
-            
-            st.success(f"✨ {mood.capitalize()} {genre.capitalize()} Songs:")
-            for idx, (_, row) in enumerate(recommendations.iterrows(), 1):
+            genre = None if journey_genre == "Any genre" else journey_genre
+            st.session_state["journey_result"] = engine.mood_playlist(waypoints, n_tracks, genre)
+        
+        playlist = st.session_state.get("journey_result")
+        if playlist is not None:
+            st.success(f"✨ {len(playlist)}-song mood journey:")
+            for idx, row in enumerate(playlist.itertuples(), 1):
                 col1, col2 = st.columns([0.3, 3])
                 with col1:
                     st.metric("", f"#{idx}")
                 with col2:
-                    st.write(f"**{row['song']}** • {row['artist']}")
-                    st.caption(f"⭐ {row['popularity']}/100 • 🎵 {row['genre']}")
+                    st.write(f"**{row.song}** • {row.artist}")
+                    st.caption(f"⚡ {row.energy:.2f} energy • 😊 {row.valence:.2f} valence • 🎵 {row.genre}")
 
 # ====== PAGE 3: SPOTIFY SEARCH ======
 elif page == "🎧 Spotify Search":
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    # Network calls run on a shared thread pool; this thread only renders.
+    # Whatever arrives first is shown straight away and replaced when
+    # something better comes in.
+    SPOTIFY_TIMEOUT = 8
+
+    @st.cache_resource
+    def get_executor():
+        return ThreadPoolExecutor(max_workers=8, thread_name_prefix="spotify")
+
+    @st.cache_resource
+    def get_spotify_client(client_id, client_secret):
+        # Building the client is local; the token is fetched on first use
+        return spotipy.Spotify(
+            auth_manager=SpotifyClientCredentials(
+                client_id=client_id,
+                client_secret=client_secret
+            ),
+            requests_timeout=5,
+            retries=0
+        )
+
+    def search_track(sp, query):
+        items = sp.search(q=query, type="track", limit=1)["tracks"]["items"]
+        return items[0] if items else None
+
+    def fetch_audio_features(sp, track_id):
+        audio_features = sp.audio_features([track_id])[0]
+        if not audio_features:
+            return None
+        return [
+            audio_features.get("danceability", 0.5),
+            audio_features.get("energy", 0.5),
+            audio_features.get("tempo", 120),
+            audio_features.get("valence", 0.5)
+        ]
+
+    def cached_features(song_name):
+        # Features already in dataset.csv / feature_store.csv for a title
+        row = engine.lookup(song_name)
+        if row is None:
+            return None
+        return [engine.columns[f][row] for f in ["danceability", "energy", "tempo", "valence"]]
+
+    def render_track(track):
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            if track["album"]["images"]:
+                st.image(track["album"]["images"][0]["url"], width=200)
+        with col2:
+            st.success(f"✨ Found on Spotify: **{track['name']}**")
+            st.write(f"Artist: {track['artists'][0]['name']}")
+            st.write(f"Album: {track['album']['name']}")
+            st.caption(f"🔗 [Open on Spotify](https://open.spotify.com/track/{track['id']})")
+
+    def render_matches(result):
+        recommendations = result["recommendations"]
+        st.divider()
+        st.subheader(f"🎵 Top {len(recommendations)} Matches in Our Dataset:")
+        if result["note"]:
+            st.caption(result["note"])
+        for idx, row in enumerate(recommendations.itertuples(), 1):
+            col1, col2 = st.columns([0.3, 3])
+            with col1:
+                st.metric("", f"#{idx}")
+            with col2:
+                st.write(f"**{row.song}** • {row.artist}")
+                st.caption(f"📂 {row.genre} • ⭐ {row.popularity}/100")
+
     st.header("🎧 Spotify Search & Match")
     st.markdown("Search for a song on Spotify and find similar songs in our dataset")
     
+    client_id, client_secret = get_spotify_credentials()
     if not client_id or not client_secret:
         st.error("❌ Spotify credentials not configured")
         st.info("📝 Instructions: Add your Spotify credentials to the app settings")
@@ -217,112 +291,163 @@ elif page == "🎧 Spotify Search":
         n_recommendations = st.number_input("Number of recommendations", min_value=1, max_value=20, value=5, key="spotify_n")
         
         if st.button("🔍 Search on Spotify", key="btn_spotify"):
+            st.session_state.pop("spotify_result", None)
             if not song_query:
                 st.warning("⚠️ Please enter a song name")
             else:
+                executor = get_executor()
+                sp = get_spotify_client(client_id, client_secret)
+                deadline = time.monotonic() + SPOTIFY_TIMEOUT
+                track_slot = st.empty()
+                status_slot = st.empty()
+                matches_slot = st.empty()
+                track = None
+                result = None
+
+                def show(features, note):
+                    # Score locally and (re)draw the matches
+                    shown = {
+                        "track": track,
+                        "recommendations": engine.from_vector(features, n_recommendations),
+                        "note": note,
+                    }
+                    with matches_slot.container():
+                        render_matches(shown)
+                    return shown
+
+                search_future = executor.submit(search_track, sp, song_query)
+                local_future = executor.submit(cached_features, song_query)
+                status_slot.caption("⏳ Searching Spotify...")
+
+                # Local matches for the typed title usually land first
+                try:
+                    local_vector = local_future.result(timeout=SPOTIFY_TIMEOUT)
+                except Exception:
+                    local_vector = None
+                if local_vector is not None:
+                    result = show(local_vector, f"💾 Based on cached features for '{song_query}' while Spotify responds")
+
                 try:
-                    with st.spinner("Connecting to Spotify API..."):
-                        sp = spotipy.Spotify(
-                            auth_manager=SpotifyClientCredentials(
-                                client_id=client_id,
-                                client_secret=client_secret
-                            )
-                        )
-                    
-                    with st.spinner("Searching for your song..."):
-                        result = sp.search(q=song_query, type="track", limit=1)
-                    
-                    if not result["tracks"]["items"]:
-                        st.error(f"❌ Song '{song_query}' not found on Spotify")
+                    track = search_future.result(timeout=max(0, deadline - time.monotonic()))
+                    if track is None:
+                        status_slot.empty()
+                        if result is None:
+                            st.error(f"❌ Song '{song_query}' not found on Spotify")
                     else:
-                        track = result["tracks"]["items"][0]
-                        
-                        with st.spinner("Fetching audio features..."):
-                            audio_features = sp.audio_features([track["id"]])[0]
-                        
-                        if not audio_features:
-                            st.error(f"❌ Could not fetch audio features for '{track['name']}'")
+                        with track_slot.container():
+                            render_track(track)
+                        status_slot.caption("⏳ Fetching audio features...")
+                        features_future = executor.submit(fetch_audio_features, sp, track["id"])
+                        try:
+                            live_vector = features_future.result(timeout=max(0, deadline - time.monotonic()))
+                        except Exception:
+                            live_vector = None
+                        status_slot.empty()
+
+                        if live_vector is not None:
+                            result = show(live_vector, None)
                         else:
-                            live_vector = [
-                                audio_features.get("danceability", 0.5),
-                                audio_features.get("energy", 0.5),
-                                audio_features.get("tempo", 120),
-                                audio_features.get("valence", 0.5)
-                            ]
-                            
-                            live_vector_scaled = scaler.transform([live_vector])
-                            similarities = cosine_similarity(live_vector_scaled, scaled_features)[0]
-                            
-                            temp_df = df.copy()
-                            temp_df["similarity"] = similarities
-                            recommendations = temp_df.sort_values(by="similarity", ascending=False).head(n_recommendations)
-                            
-                            # Display found song
-                            col1, col2 = st.columns([1, 2])
-                            with col1:
-                                if track["album"]["images"]:
-                                    st.image(track["album"]["images"][0]["url"], width=200)
-                            with col2:
-                                st.success(f"✨ Found on Spotify: **{track['name']}**")
-                                st.write(f"Artist: {track['artists'][0]['name']}")
-                                st.write(f"Album: {track['album']['name']}")
-                                st.caption(f"🔗 [Open on Spotify](https://open.spotify.com/track/{track['id']})")
-                            
-                            st.divider()
-                            st.subheader(f"🎵 Top {n_recommendations} Matches in Our Dataset:")
-                            for idx, (_, row) in enumerate(recommendations.iterrows(), 1):
-                                col1, col2 = st.columns([0.3, 3])
-                                with col1:
-                                    st.metric("", f"#{idx}")
-                                with col2:
-                                    st.write(f"**{row['song']}** • {row['artist']}")
-                                    st.caption(f"📂 {row['genre']} • ⭐ {row['popularity']}/100")
-                        
+                            # Spotify's audio features are unavailable (deprecated
+                            # endpoint, slow or failed): fall back to our own copy
+                            fallback = cached_features(track["name"])
+                            if fallback is not None:
+                                result = show(fallback, f"💾 Spotify audio features unavailable; using cached features for '{track['name']}'")
+                            elif result is not None:
+                                result["track"] = track
+                            else:
+                                st.error(f"❌ Could not fetch audio features for '{track['name']}'")
+                except FutureTimeout:
+                    status_slot.empty()
+                    st.warning(f"⚠️ Spotify did not respond within {SPOTIFY_TIMEOUT}s")
+                    if local_vector is not None:
+                        result = show(local_vector, f"💾 Based on cached features for '{song_query}'")
                 except spotipy.exceptions.SpotifyException as e:
+                    status_slot.empty()
                     st.error(f"❌ Spotify API Error: {str(e)}")
                     st.info("💡 Your credentials might be invalid. Check app settings → Secrets")
                 except Exception as e:
+                    status_slot.empty()
                     st.error(f"❌ Error: {str(e)}")
                     st.info("💡 Please try again or refresh the page")
 
+                if result is not None:
+                    st.session_state["spotify_result"] = result
+        else:
+            result = st.session_state.get("spotify_result")
+            if result is not None:
+                if result["track"] is not None:
+                    render_track(result["track"])
+                render_matches(result)
+
 # ====== PAGE 4: FEATURE ANALYSIS ======
 elif page == "📊 Feature Analysis":
+    # The figures are drawn and rendered to PNG once per index version and
+    # reused on every rerun
+    df = engine.df
+
+    @st.cache_resource
+    def get_eda_figures(index_version):
+        from io import BytesIO
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        figures = {}
+
+        def render(name, fig):
+            buffer = BytesIO()
+            fig.savefig(buffer, format="png", bbox_inches="tight")
+            plt.close(fig)
+            figures[name] = buffer.getvalue()
+
+        fig, ax = plt.subplots(figsize=(8, 5))
+        sns.histplot(df["energy"], kde=True, ax=ax, color="#1DB954")
+        ax.set_xlabel("Energy")
+        ax.set_ylabel("Frequency")
+        render("energy", fig)
+
+        fig, ax = plt.subplots(figsize=(8, 5))
+        sns.histplot(df["valence"], kde=True, ax=ax, color="#1ED760")
+        ax.set_xlabel("Valence (Happiness)")
+        ax.set_ylabel("Frequency")
+        render("valence", fig)
+
+        fig, ax = plt.subplots(figsize=(8, 6))
+        corr = df[["danceability", "energy", "tempo", "valence"]].corr()
+        sns.heatmap(corr, annot=True, cmap="coolwarm", ax=ax, cbar_kws={'label': 'Correlation'})
+        render("corr", fig)
+
+        fig, ax = plt.subplots(figsize=(12, 6))
+        genres = df["genre"].value_counts().head(10).index
+        sns.scatterplot(data=df[df["genre"].isin(genres)], x="energy", y="valence", 
+                        hue="genre", ax=ax, s=50, alpha=0.6)
+        ax.set_xlabel("Energy")
+        ax.set_ylabel("Valence (Happiness)")
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
+        render("scatter", fig)
+
+        return figures
+
     st.header("📊 Audio Feature Analysis")
     st.markdown("Explore the distribution and relationships of audio features")
     
+    figures = get_eda_figures(getattr(engine, "index_path", None))
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("🎵 Energy Distribution")
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.histplot(df["energy"], kde=True, ax=ax, color="#1DB954")
-        ax.set_xlabel("Energy")
-        ax.set_ylabel("Frequency")
-        st.pyplot(fig)
+        st.image(figures["energy"])
     
     with col2:
         st.subheader("😊 Valence Distribution")
-        fig, ax = plt.subplots(figsize=(8, 5))
-        sns.histplot(df["valence"], kde=True, ax=ax, color="#1ED760")
-        ax.set_xlabel("Valence (Happiness)")
-        ax.set_ylabel("Frequency")
-        st.pyplot(fig)
+        st.image(figures["valence"])
     
     st.subheader("🔗 Feature Correlation Matrix")
-    fig, ax = plt.subplots(figsize=(8, 6))
-    corr = df[["danceability", "energy", "tempo", "valence"]].corr()
-    sns.heatmap(corr, annot=True, cmap="coolwarm", ax=ax, cbar_kws={'label': 'Correlation'})
-    st.pyplot(fig)
+    st.image(figures["corr"])
     
     st.subheader("⚡ Energy vs Valence by Genre")
-    fig, ax = plt.subplots(figsize=(12, 6))
-    genres = df["genre"].value_counts().head(10).index
-    sns.scatterplot(data=df[df["genre"].isin(genres)], x="energy", y="valence", 
-                    hue="genre", ax=ax, s=50, alpha=0.6)
-    ax.set_xlabel("Energy")
-    ax.set_ylabel("Valence (Happiness)")
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
-    st.pyplot(fig)
+    st.image(figures["scatter"])
     
     # Statistics
     st.subheader("📈 Dataset Statistics")
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from engine import StringColumn
+
+# ===============================
+# VERSIONED INDEX + HOT SWAP
+# ===============================
+# build-index publishes each index as an immutable version:
+#   index/
+#     CURRENT                    name of the version being served
+#     versions/20250101-120000/  everything RecommendationEngine.save() writes
+#       manifest.json            scaler parameters, sizes and a SHA-256 per file
+# A version is written under a temporary name and renamed into place, and
+# CURRENT is replaced with os.replace(), so readers only ever see a complete
+# version and a complete pointer. Rolling back is pointing CURRENT at an
+# older version.
+#
+# EngineHandle serves whichever version CURRENT names, checked against its
+# manifest at startup as on every swap. When the pointer changes it
+# verifies, loads and warms the new version on a background thread and then
+# swaps one reference; requests that already took the old engine finish on
+# it. A flat index directory from earlier releases (no
+# CURRENT file) still loads as before.
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+FORMAT = 1
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def version_path(root, version):
+    return os.path.join(root, VERSIONS_DIR, version)
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_index(root):
+    # Directory to load: the current version of a versioned index, else root
+    version = current_version(root) if root else None
+    return version_path(root, version) if version else root
+
+
+def _published(path):
+    # Publication time of a version; directory mtime for manifests that
+    # predate the "published" field
+    try:
+        return float(read_manifest(path)["published"])
+    except (KeyError, ValueError, OSError):
+        return os.path.getmtime(path)
+
+
+def list_versions(root):
+    # Published versions, oldest first by publication time, not by name
+    # (temporary build directories excluded)
+    path = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(path):
+        return []
+    versions = [v for v in os.listdir(path) if not v.startswith(".")
+                and os.path.exists(os.path.join(path, v, MANIFEST_FILE))]
+    return sorted(versions, key=lambda v: (_published(os.path.join(path, v)), v))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(path, engine, version):
+    files = {}
+    for name in sorted(os.listdir(path)):
+        if name != MANIFEST_FILE:
+            full = os.path.join(path, name)
+            files[name] = {"bytes": os.path.getsize(full), "sha256": _sha256(full)}
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "published": time.time(),
+        "songs": len(engine),
+        "scaler": {"mean": np.asarray(engine.mean).tolist(), "scale": np.asarray(engine.scale).tolist()},
+        "files": files,
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify(path):
+    # Raises ValueError if a file listed in the manifest is missing or changed
+    manifest = read_manifest(path)
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported index format {manifest.get('format')} in '{path}'")
+    for name, expected in manifest["files"].items():
+        full = os.path.join(path, name)
+        if not os.path.exists(full):
+            raise ValueError(f"'{name}' is missing from '{path}'")
+        if os.path.getsize(full) != expected["bytes"] or _sha256(full) != expected["sha256"]:
+            raise ValueError(f"Checksum mismatch for '{name}' in '{path}'")
+    return manifest
+
+
+def set_current(root, version):
+    # Atomically point CURRENT at an existing version
+    if not os.path.exists(os.path.join(version_path(root, version), MANIFEST_FILE)):
+        raise ValueError(f"No version '{version}' in '{root}'")
+    tmp = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def publish(engine, root, precisions=(), ann=False, version=None, activate=True):
+    # Save engine as a new version of the index at root and return its name
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    final = version_path(root, version)
+    if os.path.exists(final):
+        raise ValueError(f"Version '{version}' already exists in '{root}'")
+    tmp = os.path.join(root, VERSIONS_DIR, f".{version}.{os.getpid()}")
+    try:
+        engine.save(tmp, precisions, ann=ann)
+        write_manifest(tmp, engine, version)
+        os.replace(tmp, final)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if activate:
+        set_current(root, version)
+    return version
+
+
+def prune(root, keep=3, protect=()):
+    # Delete all but the newest `keep` versions. The current version and
+    # those in protect (e.g. one just published without activating it) are
+    # never deleted and count towards keep. Processes still serving a
+    # deleted version keep their memory maps (POSIX keeps unlinked files
+    # alive while they are mapped).
+    versions = list_versions(root)
+    kept = {current_version(root), *protect} & set(versions)
+    old = [v for v in versions if v not in kept]
+    removed = old[:max(0, len(old) - max(keep - len(kept), 0))]
+    for version in removed:
+        shutil.rmtree(version_path(root, version), ignore_errors=True)
+    return removed
+
+
+def warm_up(engine, queries=8):
+    # Page in the memory-mapped arrays and run a few queries, so the first
+    # real requests after a swap are not slower than the ones before it
+    arrays = [engine.scaled_features, engine.unit_features]
+    arrays += [c.data if isinstance(c, StringColumn) else c for c in engine.columns.values()]
+    for values in arrays:
+        np.asarray(values).sum(axis=0)
+    rows = np.linspace(0, len(engine) - 1, min(queries, len(engine))).astype(np.intp)
+    for row in rows:
+        engine.neighbours(row, 5)
+    engine.from_vector(engine.mean, 5)
+
+
+class EngineHandle:
+    # Hands out the engine for the current version. Take handle.engine once
+    # per request and use that object throughout; a swap only changes what
+    # later requests get.
+
+    def __init__(self, root, loader, check_interval=2.0):
+        # loader(path) -> RecommendationEngine for an index directory
+        self.root = root
+        self.check_interval = check_interval
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loading = None
+        self._thread = None
+        self._checked = time.monotonic()
+        self.failed = {}
+        self.version, self._engine = self._initial_load()
+
+    def _initial_load(self):
+        # The CURRENT version, verified like any later swap. If it fails,
+        # fall back to the newest older version that passes and record the
+        # failure; with no usable version at all, raise.
+        current = current_version(self.root) if self.root else None
+        if current is None:
+            return None, self._loader(self.root)
+        candidates = [current] + [v for v in reversed(list_versions(self.root)) if v != current]
+        for version in candidates:
+            path = version_path(self.root, version)
+            try:
+                verify(path)
+            except (ValueError, OSError) as e:
+                self.failed[version] = str(e) or type(e).__name__
+                continue
+            return version, self._loader(path)
+        raise ValueError(f"No version of '{self.root}' passes verification: {self.failed}")
+
+    @property
+    def engine(self):
+        self.refresh()
+        return self._engine
+
+    def refresh(self, wait=False):
+        # Start loading a new CURRENT version in the background if there is
+        # one. Checks at most every check_interval seconds unless wait=True,
+        # which also blocks until the swap is done.
+        now = time.monotonic()
+        if not self.root or (not wait and now - self._checked < self.check_interval):
+            return
+        self._checked = now
+        version = current_version(self.root)
+        with self._lock:
+            if version is None or version == self.version or version in self.failed:
+                return
+            if version != self._loading:
+                self._loading = version
+                self._thread = threading.Thread(target=self._swap, args=(version,), daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join()
+
+    def _swap(self, version):
+        try:
+            path = version_path(self.root, version)
+            verify(path)
+            engine = self._loader(path)
+            warm_up(engine)
+        except Exception as e:
+            # Keep serving the old version; a broken one is not retried
+            with self._lock:
+                self.failed[version] = str(e) or type(e).__name__
+                self._loading = None
+            return
+        with self._lock:
+            self._engine = engine
+            self.version = version
+            self._loading = None
@@ -0,0 +1,188 @@
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import FEATURE_STORE
+
+# ===============================
+# LOCAL AUDIO FEATURES
+# ===============================
+# Estimates danceability / energy / tempo / valence for audio files we have
+# locally, so songs missing from dataset.csv (and from Spotify, whose
+# audio-features endpoint is no longer available to new apps) can still be
+# scored. The numbers are proxies built from standard DSP measures, not
+# Spotify's models:
+#   tempo        - autocorrelation peak of the spectral-flux onset envelope
+#   energy       - loudness (frame RMS in dBFS) and onset density
+#   danceability - how strong and regular the beat is at that tempo
+#   valence      - spectral brightness plus a preference for faster tempi
+# Results go to a CSV "feature store" with the same columns as dataset.csv,
+# which load_dataset() appends to the catalogue.
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+# Analysis runs at ~22 kHz: 1024-sample frames, 512-sample hop
+TARGET_RATE = 22050
+FRAME = 1024
+HOP = 512
+
+
+def read_audio(path):
+    # Mono float32 samples in [-1, 1] and the sample rate. WAV is read with
+    # the standard library; other formats need the optional soundfile package.
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as f:
+            rate = f.getframerate()
+            channels = f.getnchannels()
+            width = f.getsampwidth()
+            raw = f.readframes(f.getnframes())
+        if width == 3:
+            # 24-bit PCM: widen to 32-bit before decoding
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+            raw = np.pad(b, ((0, 0), (1, 0))).tobytes()
+            width = 4
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+        samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+        if width == 1:
+            samples = (samples - 128) / 128
+        else:
+            samples /= float(2 ** (8 * width - 1))
+        samples = samples.reshape(-1, channels)
+    else:
+        try:
+            import soundfile
+        except ImportError:
+            raise ValueError(f"Reading '{os.path.splitext(path)[1]}' files needs the soundfile package")
+        samples, rate = soundfile.read(path, dtype="float32", always_2d=True)
+    return samples.mean(axis=1), rate
+
+
+def _downsample(samples, rate):
+    # Average groups of samples down to roughly TARGET_RATE (a crude low-pass)
+    factor = max(1, rate // TARGET_RATE)
+    if factor > 1:
+        usable = len(samples) - len(samples) % factor
+        samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+    return samples, rate / factor
+
+
+def _tempo_from_onsets(onsets, frame_rate, min_bpm=60, max_bpm=200):
+    # Autocorrelation of the onset envelope via FFT; lags are weighted with a
+    # log-normal prior centred on 120 BPM to avoid half/double tempo errors
+    env = onsets - onsets.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(env))))
+    spectrum = np.fft.rfft(env, size)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum), size)[:len(env)]
+    if acf[0] <= 0:
+        return 120.0, 0.0
+    acf /= acf[0]
+    lags = np.arange(int(frame_rate * 60 / max_bpm), int(frame_rate * 60 / min_bpm) + 1)
+    lags = lags[lags < len(acf)]
+    if len(lags) == 0:
+        return 120.0, 0.0
+    bpm = 60 * frame_rate / lags
+    prior = np.exp(-0.5 * (np.log2(bpm / 120.0) / 0.9) ** 2)
+    best = np.argmax(acf[lags] * prior)
+    return float(bpm[best]), float(max(acf[lags[best]], 0.0))
+
+
+def extract_features(path):
+    samples, rate = read_audio(path)
+    samples, rate = _downsample(samples, rate)
+    if len(samples) < FRAME * 8:
+        raise ValueError("Audio is too short to analyse")
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::HOP]
+    frame_rate = rate / HOP
+
+    # RMS loudness per frame, in dBFS
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    loudness = 20 * np.log10(np.maximum(rms, 1e-5))
+
+    # Magnitude spectra for all frames in one batched FFT
+    spectra = np.abs(np.fft.rfft(frames * np.hanning(FRAME).astype(np.float32), axis=1))
+    freqs = np.fft.rfftfreq(FRAME, 1 / rate)
+
+    # Spectral flux onset envelope: summed positive change in log magnitude
+    log_spec = np.log1p(100 * spectra)
+    onsets = np.maximum(np.diff(log_spec, axis=0), 0).sum(axis=1)
+    tempo, beat_strength = _tempo_from_onsets(onsets, frame_rate)
+
+    # Onsets per second: local flux peaks clearly above the median
+    peaks = (onsets[1:-1] > onsets[:-2]) & (onsets[1:-1] >= onsets[2:]) \
+        & (onsets[1:-1] > 1.5 * np.median(onsets))
+    onset_rate = peaks.sum() / (len(samples) / rate)
+
+    power = spectra.sum(axis=1)
+    centroid = (spectra @ freqs) / np.maximum(power, 1e-9)
+    brightness = np.median(centroid[power > 1e-6]) if (power > 1e-6).any() else 0.0
+
+    loud_norm = np.clip((np.percentile(loudness, 90) + 40) / 36, 0, 1)
+    energy = 0.7 * loud_norm + 0.3 * np.clip(onset_rate / 6, 0, 1)
+    tempo_fit = np.exp(-0.5 * ((tempo - 118) / 30) ** 2)
+    danceability = 0.6 * np.clip(beat_strength * 2, 0, 1) + 0.4 * tempo_fit
+    valence = 0.6 * np.clip(brightness / 3000, 0, 1) + 0.4 * np.clip((tempo - 60) / 120, 0, 1)
+
+    return {
+        "danceability": round(float(np.clip(danceability, 0, 1)), 4),
+        "energy": round(float(np.clip(energy, 0, 1)), 4),
+        "tempo": round(tempo, 3),
+        "valence": round(float(np.clip(valence, 0, 1)), 4),
+    }
+
+
+def _describe(path):
+    # Title and artist from "Artist - Title.ext", else the file name
+    name = os.path.splitext(os.path.basename(path))[0]
+    if " - " in name:
+        artist, title = name.split(" - ", 1)
+        return title.strip(), artist.strip()
+    return name, "Unknown"
+
+
+def _analyse(path):
+    try:
+        return path, extract_features(path), None
+    except Exception as e:
+        return path, None, str(e) or type(e).__name__
+
+
+def find_audio_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def extract_directory(directory, store_path=FEATURE_STORE, genre="local", workers=None):
+    # Analyse every audio file under directory in parallel and upsert the
+    # rows into the feature store. Returns (rows written, {path: error}).
+    if not os.path.isdir(directory):
+        raise ValueError(f"'{directory}' is not a directory")
+    paths = list(find_audio_files(directory))
+    rows, errors = [], {}
+    with ProcessPoolExecutor(workers) as pool:
+        for path, features, error in pool.map(_analyse, paths, chunksize=4):
+            if features is None:
+                errors[path] = error
+                continue
+            title, artist = _describe(path)
+            rows.append({
+                "track_name": title,
+                "artists": artist,
+                "track_genre": genre,
+                "popularity": np.nan,
+                **features,
+                "path": os.path.abspath(path),
+            })
+
+    if rows:
+        new = pd.DataFrame(rows)
+        if os.path.exists(store_path):
+            old = pd.read_csv(store_path)
+            new = pd.concat([old[~old["path"].isin(new["path"])], new], ignore_index=True)
+        new.to_csv(store_path, index=False)
+    return len(rows), errors
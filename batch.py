@@ -0,0 +1,221 @@
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from artifacts import resolve_index
+from engine import FEATURES, load_engine, mood_mapping
+
+# ===============================
+# BATCH RECOMMENDATIONS
+# ===============================
+# Reads one query per JSONL line / CSV row and writes one JSONL result per
+# query, in input order. Queries are grouped into chunks, each chunk is
+# scored with a handful of matrix products in a worker process, and only a
+# few chunks are in flight at any time, so memory stays flat however long
+# the input is.
+#
+# Query fields (the type is inferred when "type" is omitted):
+#   {"type": "similar", "song": "Blinding Lights", "n": 5}
+#   {"type": "mood", "genre": "pop", "mood": "happy", "n": 5}
+#   {"type": "vector", "danceability": 0.7, "energy": 0.8, "tempo": 120, "valence": 0.6}
+# An optional "id" is copied to the result.
+
+_engine = None
+_columns = None
+
+
+def query_type(query):
+    if query.get("type"):
+        return query["type"]
+    if query.get("song"):
+        return "similar"
+    if query.get("mood"):
+        return "mood"
+    if all(query.get(f) not in (None, "") for f in FEATURES):
+        return "vector"
+    return None
+
+
+def read_queries(stream, fmt="jsonl"):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            query = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"error": f"invalid JSON: {e}"}
+            continue
+        if isinstance(query, dict):
+            yield query
+        else:
+            yield {"error": f"query must be a JSON object, got {type(query).__name__}"}
+
+
+def iter_chunks(queries, chunk_size):
+    chunk = []
+    for query in queries:
+        chunk.append(query)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ----------------------------
+# WORKER SIDE
+# ----------------------------
+
+def init_worker(index_path, dataset_path, min_popularity, precision="float64", blas_threads=None):
+    global _engine, _columns
+    if blas_threads:
+        # One BLAS thread per process avoids oversubscribing the CPU
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    # Batches score with search() directly, so the two-stage pipeline is not needed
+    _engine = load_engine(index_path, dataset_path, min_popularity, precision, two_stage=False)
+    _columns = _engine.columns
+
+
+def _record(query, indices=None, scores=None, error=None):
+    record = {"id": query.get("id")}
+    if error is not None:
+        record["error"] = error
+    else:
+        record["results"] = [
+            {
+                "song": _columns["song"][i],
+                "artist": _columns["artist"][i],
+                "genre": _columns["genre"][i],
+                "popularity": int(_columns["popularity"][i]),
+                "similarity": round(float(score), 6),
+            }
+            for i, score in zip(indices, scores)
+        ]
+    return json.dumps(record, ensure_ascii=False)
+
+
+def process_chunk(queries):
+    engine = _engine
+    lines = [None] * len(queries)
+    similar = []
+    vectors = []
+    moods = {}
+
+    for pos, query in enumerate(queries):
+        if "error" in query:
+            lines[pos] = _record(query, error=query["error"])
+            continue
+        kind = query_type(query)
+        try:
+            n = query.get("n")
+            n = 5 if n in (None, "") else int(n)
+            if n < 1:
+                lines[pos] = _record(query, error=f"n must be at least 1, got {n}")
+            elif kind == "similar":
+                song_index = engine.lookup(str(query["song"]))
+                if song_index is None:
+                    lines[pos] = _record(query, error=f"song '{query['song']}' not found")
+                else:
+                    similar.append((pos, song_index, n))
+            elif kind == "vector":
+                vectors.append((pos, [float(query[f]) for f in FEATURES], n))
+            elif kind == "mood":
+                genre = str(query["genre"]).lower()
+                mood = str(query["mood"]).lower()
+                if mood not in mood_mapping:
+                    lines[pos] = _record(query, error=f"invalid mood '{mood}'")
+                elif genre not in engine.genre_index:
+                    lines[pos] = _record(query, error=f"genre '{query['genre']}' not found")
+                else:
+                    moods.setdefault(genre, []).append((pos, mood, n))
+            else:
+                lines[pos] = _record(query, error="unrecognised query")
+        except (KeyError, TypeError, ValueError) as e:
+            lines[pos] = _record(query, error=f"bad query: {e}")
+
+    if similar:
+        # One extra match per query because the best one is the song itself
+        k = max(n for _, _, n in similar) + 1
+        seeds = engine.scaled_features[[song_index for _, song_index, _ in similar]]
+        indices, scores = engine.search(seeds, k)
+        for row, (pos, _, n) in enumerate(similar):
+            lines[pos] = _record(queries[pos], indices[row, 1:n + 1], scores[row, 1:n + 1])
+
+    if vectors:
+        k = max(n for _, _, n in vectors)
+        indices, scores = engine.search(engine.transform([v for _, v, _ in vectors]), k)
+        for row, (pos, _, n) in enumerate(vectors):
+            lines[pos] = _record(queries[pos], indices[row, :n], scores[row, :n])
+
+    for genre, group in moods.items():
+        rows = engine.genre_index[genre]
+        k = max(n for _, _, n in group)
+        targets = engine.transform([engine.mood_vector(rows, mood) for _, mood, _ in group])
+        indices, scores = engine.search(targets, k, rows=rows)
+        for row, (pos, _, n) in enumerate(group):
+            lines[pos] = _record(queries[pos], indices[row, :n], scores[row, :n])
+
+    return lines
+
+
+# ----------------------------
+# DRIVER
+# ----------------------------
+
+def run_batch(source, out, fmt="jsonl", workers=None, chunk_size=1000,
+              index_path="index", dataset_path="dataset.csv", min_popularity=50, precision="float64"):
+    workers = workers or os.cpu_count() or 1
+    # Pin one index version so every worker answers from the same catalogue
+    # even if a new one is published mid-run
+    index_path = resolve_index(index_path)
+    chunks = iter_chunks(read_queries(source, fmt), chunk_size)
+    count = 0
+
+    def write(lines):
+        out.write("\n".join(lines))
+        out.write("\n")
+
+    if workers == 1:
+        init_worker(index_path, dataset_path, min_popularity, precision)
+        for chunk in chunks:
+            write(process_chunk(chunk))
+            count += len(chunk)
+        return count
+
+    # Results are written in submission order; at most two chunks per
+    # worker are queued so a slow writer cannot make the input pile up
+    max_pending = workers * 2
+    init_args = (index_path, dataset_path, min_popularity, precision, 1)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=init_args) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(process_chunk, chunk)))
+            if len(pending) >= max_pending:
+                size, future = pending.popleft()
+                write(future.result())
+                count += size
+        while pending:
+            size, future = pending.popleft()
+            write(future.result())
+            count += size
+    return count
+
+
+def open_input(path):
+    if path in (None, "-"):
+        return sys.stdin
+    return open(path, newline="", encoding="utf-8")
+
+
+def guess_format(path):
+    if path and path.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
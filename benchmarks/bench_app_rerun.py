@@ -0,0 +1,53 @@
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+# ----------------------------
+# STREAMLIT RERUN LATENCY
+# ----------------------------
+# Times a full script rerun on every page of the app, the cost paid on each
+# widget interaction. Compare two versions of the app with e.g.
+#   git show HEAD~1:app.py > /tmp/app_old.py
+#   python benchmarks/bench_app_rerun.py app.py /tmp/app_old.py
+# Run from the directory that holds dataset.csv.
+
+PAGES = [
+    "🔎 Song-to-Song",
+    "😊 Mood-Based",
+    "🎧 Spotify Search",
+    "📊 Feature Analysis",
+    "ℹ️ About"
+]
+
+
+def time_reruns(app_path, page, runs):
+    at = AppTest.from_file(os.path.abspath(app_path), default_timeout=120)
+    at.run()
+    at.sidebar.radio[0].set_value(page)
+    # First run on the page warms any per-page caches
+    at.run()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Median rerun latency per app page")
+    parser.add_argument("apps", nargs="+", help="app files to compare")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'page':<22}" + "".join(f"{app:>20}" for app in args.apps))
+    for page in PAGES:
+        medians = [time_reruns(app, page, args.runs) for app in args.apps]
+        print(f"{page:<22}" + "".join(f"{m * 1000:>18.1f}ms" for m in medians))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import load_engine  # noqa: E402
+from quantize import QuantizedScorer  # noqa: E402
+
+# ----------------------------
+# QUANTIZATION ACCURACY REPORT
+# ----------------------------
+# Compares song-to-song top-k results at each precision against the
+# original float64 sklearn cosine_similarity ranking, reporting top-k
+# overlap, how often the top-1 matches, scan size and query throughput.
+# A longer re-rank shortlist trades speed for agreement; with only four
+# feature dimensions a dense catalogue has many near-ties, so int8 needs a
+# longer one than float16.
+#   python benchmarks/bench_quantization.py --queries 500 -k 10 --shortlist 1024
+
+
+def reference_top_k(engine, seeds, k):
+    # The ranking the scripts have always produced: cosine_similarity on the
+    # float64 scaled features, sorted, skipping the song itself
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    scores = cosine_similarity(engine.scaled_features[seeds], engine.scaled_features)
+    return np.argsort(-scores, axis=1, kind="stable")[:, 1:k + 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top-k agreement of quantized scoring with float64")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--index", default="index")
+    parser.add_argument("--dataset", default="dataset.csv")
+    parser.add_argument("--shortlist", type=int, default=QuantizedScorer.MIN_SHORTLIST,
+                        help=f"minimum re-rank shortlist (default: {QuantizedScorer.MIN_SHORTLIST})")
+    args = parser.parse_args()
+    QuantizedScorer.MIN_SHORTLIST = args.shortlist
+
+    engine = load_engine(args.index, args.dataset, two_stage=False)
+    seeds = np.random.default_rng(0).choice(len(engine), min(args.queries, len(engine)), replace=False)
+    reference = reference_top_k(engine, seeds, args.k)
+
+    print(f"{len(engine)} songs, {len(seeds)} queries, k={args.k}")
+    print(f"{'precision':<10}{'overlap@k':>11}{'top-1 same':>12}{'scan MB':>10}{'queries/s':>11}")
+    for precision in ["float64", "float32", "float16", "int8"]:
+        engine.set_precision(precision)
+        start = time.perf_counter()
+        indices, _ = engine.search(engine.scaled_features[seeds], args.k + 1)
+        elapsed = time.perf_counter() - start
+        found = indices[:, 1:]
+
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, reference)])
+        top1 = np.mean(found[:, 0] == reference[:, 0])
+        scan = engine.unit_features.nbytes if engine.scorer is None else engine.scorer.nbytes
+        print(f"{precision:<10}{overlap:>11.4f}{top1:>12.4f}{scan / 2**20:>10.1f}{len(seeds) / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
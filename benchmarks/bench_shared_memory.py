@@ -0,0 +1,79 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ----------------------------
+# MEMORY PER WORKER PROCESS
+# ----------------------------
+# Starts several worker processes that each load the engine and answer a
+# batch of queries, and reports how much unshareable (anonymous) memory the
+# engine added to each one. With the memory-mapped index the catalogue is
+# shared through the page cache, so this should be close to zero; compare
+# with --mode copy (index read into private memory) or --mode fit (refit
+# from the CSV, as every process did before the index existed).
+#   python cli.py build-index
+#   python benchmarks/bench_shared_memory.py --workers 4 --mode mmap
+# Linux only (reads /proc/self/smaps_rollup).
+
+
+def private_kb():
+    # Anonymous memory is what a process cannot share. Pages of a mapped file
+    # show up as Private_Clean while only one process has touched them, but
+    # they live once in the page cache however many workers map them.
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker(mode, index_path, dataset_path, queries, results):
+    import numpy as np
+    from artifacts import resolve_index
+    from engine import RecommendationEngine, load_dataset
+
+    before = private_kb()
+    if mode == "fit":
+        engine = RecommendationEngine(load_dataset(dataset_path))
+    else:
+        engine = RecommendationEngine.load(resolve_index(index_path), mmap=(mode == "mmap"))
+    rng = np.random.default_rng(os.getpid())
+    # Each query scans every feature row; results touch the catalogue columns
+    for seed in rng.integers(0, len(engine), queries):
+        engine.similar(engine.columns["song"][seed])
+    results.put((mode, private_kb() - before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unshared memory added per worker by the engine")
+    parser.add_argument("--mode", choices=["mmap", "copy", "fit"], default="mmap")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--index", default="index")
+    parser.add_argument("--dataset", default="dataset.csv")
+    args = parser.parse_args()
+
+    # spawn, so workers do not inherit the parent's pages copy-on-write
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(args.mode, args.index, args.dataset, args.queries, results))
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+    deltas = [results.get()[1] for _ in procs]
+    for p in procs:
+        p.join()
+
+    print(f"mode={args.mode} workers={args.workers}")
+    for i, kb in enumerate(deltas, 1):
+        print(f"  worker {i}: +{kb / 1024:.1f} MB anonymous")
+    print(f"  mean: +{sum(deltas) / len(deltas) / 1024:.1f} MB anonymous per worker")
+
+
+if __name__ == "__main__":
+    main()
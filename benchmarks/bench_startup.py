@@ -0,0 +1,53 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# ----------------------------
+# CLI STARTUP TIME
+# ----------------------------
+# Wall-clock time for a one-shot song-to-song lookup through the different
+# entry points. Pass the pre-CLI menu script with --baseline, e.g.
+#   git show <old-commit>:full.py > /tmp/full_old.py
+#   python benchmarks/bench_startup.py --song "Song 5" --baseline /tmp/full_old.py
+# Run from the directory that holds dataset.csv (and index/ once built).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_command(cmd, stdin, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, input=stdin, capture_output=True, text=True, check=False)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the CLI entry points")
+    parser.add_argument("--song", required=True, help="a song title present in the dataset")
+    parser.add_argument("--baseline", help="old full.py to compare against")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    cli = os.path.join(ROOT, "cli.py")
+    full = os.path.join(ROOT, "full.py")
+    menu_input = f"1\n{args.song}\n5\n"
+    cases = [
+        ("cli.py --help", [sys.executable, cli, "--help"], None),
+        ("cli.py similar (index)", [sys.executable, cli, "similar", args.song], None),
+        ("cli.py similar (refit)", [sys.executable, cli, "--index", "", "similar", args.song], None),
+        ("full.py menu", [sys.executable, full], menu_input),
+    ]
+    if args.baseline:
+        cases.append(("baseline full.py menu", [sys.executable, args.baseline], menu_input))
+
+    for name, cmd, stdin in cases:
+        print(f"{name:<26}{time_command(cmd, stdin, args.runs) * 1000:>10.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import load_engine  # noqa: E402
+
+# ----------------------------
+# TWO-STAGE PIPELINE REPORT
+# ----------------------------
+# Song-to-song queries one at a time (as the app and CLI issue them), full
+# scan vs the two-stage pipeline. Recall@k is measured against the exact
+# cosine ranking with the popularity and diversity terms switched off, so
+# it shows what candidate generation loses; the default settings are timed
+# too. Build the index with IVF lists first:
+#   python cli.py build-index --ann
+#   python benchmarks/bench_two_stage.py --queries 200 -k 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and recall of the two-stage pipeline")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--index", default="index")
+    parser.add_argument("--dataset", default="dataset.csv")
+    args = parser.parse_args()
+
+    engine = load_engine(args.index, args.dataset, two_stage=False)
+    seeds = np.random.default_rng(0).choice(len(engine), min(args.queries, len(engine)), replace=False)
+    titles = [engine.columns["song"][s] for s in seeds]
+
+    def run():
+        start = time.perf_counter()
+        results = [engine.similar(title, args.k)[1].index.to_numpy() for title in titles]
+        return results, (time.perf_counter() - start) / len(titles)
+
+    exact, exact_time = run()
+    print(f"{len(engine)} songs, {len(seeds)} queries, k={args.k}")
+    print(f"{'mode':<28}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{'exact scan':<28}{1.0:>10.4f}{exact_time * 1000:>10.2f}")
+
+    settings = [
+        ("two-stage, cosine only", dict(popularity_weight=0.0, diversity=0.0)),
+        ("two-stage, n_probe=16", dict(popularity_weight=0.0, diversity=0.0, n_probe=16)),
+        ("two-stage, defaults", {}),
+    ]
+    for name, options in settings:
+        engine.set_pipeline(**options)
+        found, elapsed = run()
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, exact)])
+        print(f"{name:<28}{recall:>10.4f}{elapsed * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+import argparse
+import os
+import sys
+from functools import lru_cache
+
+# Only the standard library is imported up front. pandas/numpy come in with
+# the engine, spotipy and matplotlib only for the subcommands that use them.
+
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+
+@lru_cache(maxsize=None)
+def cached_handle(index="index", dataset="dataset.csv", min_popularity=50, precision="float64", two_stage=None):
+    # Follows the index's CURRENT version, so a long-running menu session
+    # picks up a newly built index without restarting
+    from artifacts import EngineHandle
+    from engine import load_engine
+    return EngineHandle(index, lambda path: load_engine(path, dataset, min_popularity, precision, two_stage))
+
+
+def cached_engine(index="index", dataset="dataset.csv", min_popularity=50, precision="float64", two_stage=None):
+    return cached_handle(index, dataset, min_popularity, precision, two_stage).engine
+
+
+def get_engine(args):
+    return cached_engine(args.index, args.dataset, args.min_popularity, args.precision, args.two_stage)
+
+
+def print_songs(recommendations):
+    for row in recommendations.itertuples():
+        print(f" {row.song} — {row.artist} (Genre: {row.genre})")
+
+
+# ===============================
+# SUBCOMMANDS
+# ===============================
+
+def cmd_similar(args):
+    engine = get_engine(args)
+    if args.blend:
+        from collaborative import similar_blended
+        try:
+            song_index, recommendations = similar_blended(
+                engine, load_collaborative(args), args.song, args.n, args.blend)
+        except ValueError as e:
+            print(f" {e}")
+            return 1
+    else:
+        song_index, recommendations = engine.similar(args.song, args.n)
+    if song_index is None:
+        print(f" Song '{args.song}' not found. Try another one.")
+        return 1
+
+    print(f"\n Top {args.n} Songs similar to '{engine.columns['song'][song_index]}':\n")
+    print_songs(recommendations)
+    return 0
+
+
+def cmd_mood(args):
+    from engine import mood_mapping
+
+    mood = args.mood.lower()
+    if mood not in mood_mapping:
+        print(" Invalid mood.")
+        return 1
+
+    recommendations = get_engine(args).by_mood(args.genre, mood, args.n)
+    if recommendations is None:
+        print(" Genre not found.")
+        return 1
+
+    print(f"\n {mood.capitalize()} {args.genre.capitalize()} Songs:\n")
+    for row in recommendations.itertuples():
+        print(f"{row.song} — {row.artist}")
+    return 0
+
+
+def parse_waypoint(text):
+    # "chill" or "energy=0.3,valence=0.4,tempo=100"
+    if "=" not in text:
+        return text
+    return {key.strip(): float(value) for key, value in (part.split("=") for part in text.split(","))}
+
+
+def parse_range(text):
+    # "energy=0.6:1.0", either bound may be left out ("tempo=:110")
+    feature, bounds = text.split("=")
+    low, high = bounds.split(":")
+    return feature.strip(), (float(low) if low else None, float(high) if high else None)
+
+
+def cmd_playlist(args):
+    try:
+        waypoints = [parse_waypoint(w) for w in args.waypoints]
+        ranges = dict(parse_range(r) for r in args.range)
+        recommendations = get_engine(args).mood_playlist(waypoints, args.n, args.genre, ranges)
+    except ValueError as e:
+        print(f" {e}")
+        return 1
+    if recommendations is None:
+        print(" Genre not found.")
+        return 1
+
+    print(f"\n {' → '.join(args.waypoints)} ({len(recommendations)} songs):\n")
+    for row in recommendations.itertuples():
+        print(f" {row.song} — {row.artist} (energy {row.energy:.2f}, valence {row.valence:.2f}, {row.tempo:.0f} BPM)")
+    return 0
+
+
+def check_spotify_credentials(client_id, client_secret):
+    if not client_id or not client_secret:
+        return False, "Missing credentials in file.env"
+    if len(client_id) != 32 or len(client_secret) != 32:
+        return False, f"Invalid credential lengths (Client ID: {len(client_id)}, Secret: {len(client_secret)}). Both should be 32."
+    return True, "OK"
+
+
+def cmd_live(args):
+    from dotenv import load_dotenv
+
+    load_dotenv("file.env")
+    client_id = os.getenv("SPOTIFY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+
+    is_ok, msg = check_spotify_credentials(client_id, client_secret)
+    if not is_ok:
+        print(f"\n⚠️  Spotify Error: {msg}")
+        print("Please fix 'file.env' to use this feature.")
+        return 1
+
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    song_query = args.query or input("\nEnter a song name to search on Spotify: ")
+    try:
+        sp = spotipy.Spotify(
+            auth_manager=SpotifyClientCredentials(
+                client_id=client_id,
+                client_secret=client_secret
+            )
+        )
+        result = sp.search(q=song_query, type="track", limit=1)
+
+        if not result["tracks"]["items"]:
+            print(f"❌ Song '{song_query}' not found on Spotify.")
+            return 1
+
+        track = result["tracks"]["items"][0]
+        audio_features = sp.audio_features([track["id"]])[0]
+
+        if not audio_features:
+            print(f"❌ Could not fetch details for '{track['name']}'.")
+            return 1
+    except Exception as e:
+        print(f"❌ Spotify API Error: {e}")
+        return 1
+
+    live_vector = [
+        audio_features["danceability"],
+        audio_features["energy"],
+        audio_features["tempo"],
+        audio_features["valence"]
+    ]
+    recommendations = get_engine(args).from_vector(live_vector, args.n)
+
+    print(f"\n✨ Found on Spotify: '{track['name']}' by {track['artists'][0]['name']}")
+    print(f"--- Top {args.n} Recommendations from local dataset ---\n")
+    print(recommendations[["song", "artist", "genre", "popularity"]])
+    return 0
+
+
+def cmd_eda(args):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    df = get_engine(args).df
+
+    plt.figure(figsize=(6,4))
+    sns.histplot(df["energy"], kde=True)
+    plt.title("Energy Distribution")
+    plt.show()
+
+    plt.figure(figsize=(6,4))
+    corr = df[["danceability", "energy", "tempo", "valence"]].corr()
+    sns.heatmap(corr, annot=True, cmap="coolwarm")
+    plt.title("Audio Feature Correlation")
+    plt.show()
+
+    plt.figure(figsize=(6,4))
+    sns.scatterplot(
+        x=df["energy"],
+        y=df["valence"],
+        hue=df["genre"],
+        legend=False
+    )
+    plt.title("Energy vs Valence")
+    plt.show()
+    return 0
+
+
+def load_collaborative(args):
+    from collaborative import ImplicitALS
+    return ImplicitALS.load(args.index)
+
+
+def cmd_train_cf(args):
+    from collaborative import ImplicitALS, load_interactions
+
+    engine = get_engine(args)
+    try:
+        user_ids, user_items = load_interactions(
+            args.logs, engine, args.user_col, args.song_col, args.weight_col)
+    except (ValueError, OSError) as e:
+        print(f" {e}")
+        return 1
+    print(f"Training on {user_items.nnz} interactions from {len(user_ids)} users")
+    model = ImplicitALS(
+        factors=args.factors,
+        regularization=args.regularization,
+        alpha=args.alpha,
+        iterations=args.iterations,
+        threads=args.threads,
+    ).fit(user_ids, user_items, catalogue=engine.catalogue_id)
+    model.save(args.index)
+    print(f"Saved collaborative model to '{args.index}'")
+    return 0
+
+
+def cmd_user(args):
+    from collaborative import recommend_for_user
+
+    try:
+        recommendations = recommend_for_user(
+            get_engine(args), load_collaborative(args), args.user, args.n, args.blend)
+    except ValueError as e:
+        print(f" {e}")
+        return 1
+    if recommendations is None:
+        print(f" User '{args.user}' not found.")
+        return 1
+
+    print(f"\n Top {args.n} Songs for user '{args.user}':\n")
+    print_songs(recommendations)
+    return 0
+
+
+def cmd_extract(args):
+    from audio_features import extract_directory
+
+    try:
+        count, errors = extract_directory(args.directory, args.store, args.genre, args.workers)
+    except ValueError as e:
+        print(f" {e}")
+        return 1
+    for path, error in errors.items():
+        print(f"❌ {path}: {error}")
+    print(f"Added {count} tracks to '{args.store}'")
+    if count and os.path.exists(args.index):
+        print("Run 'python cli.py build-index' to include them in the index.")
+    return 0 if count or not errors else 1
+
+
+def cmd_build_index(args):
+    from artifacts import prune, publish
+    from engine import RecommendationEngine, load_dataset
+
+    engine = RecommendationEngine(load_dataset(args.dataset, args.min_popularity))
+    try:
+        version = publish(engine, args.index, args.quantize, ann=args.ann,
+                          version=args.version, activate=not args.no_activate)
+    except ValueError as e:
+        print(f" {e}")
+        return 1
+    print(f"Indexed {len(engine)} songs into '{args.index}' as version {version}"
+          + ("" if args.no_activate else " (now current)"))
+    for old in prune(args.index, args.keep, protect=[version]):
+        print(f"Removed old version {old}")
+    return 0
+
+
+def cmd_versions(args):
+    from artifacts import current_version, list_versions, read_manifest, verify, version_path
+
+    versions = list_versions(args.index)
+    if not versions:
+        print(f" No versions in '{args.index}'. Run 'python cli.py build-index' first.")
+        return 1
+    current = current_version(args.index)
+    status = 0
+    for version in versions:
+        path = version_path(args.index, version)
+        manifest = read_manifest(path)
+        size = sum(f["bytes"] for f in manifest["files"].values())
+        line = f"{'*' if version == current else ' '} {version}  {manifest['songs']} songs  " \
+               f"{size / 2**20:.1f} MB  built {manifest['created']}"
+        if args.verify:
+            try:
+                verify(path)
+                line += "  ok"
+            except ValueError as e:
+                line += f"  FAILED: {e}"
+                status = 1
+        print(line)
+    return status
+
+
+def cmd_activate(args):
+    from artifacts import set_current, verify, version_path
+
+    try:
+        verify(version_path(args.index, args.version))
+        set_current(args.index, args.version)
+    except (ValueError, FileNotFoundError) as e:
+        print(f" Cannot activate '{args.version}': {e}")
+        return 1
+    print(f"'{args.index}' now serves version {args.version}")
+    return 0
+
+
+def cmd_batch(args):
+    from batch import guess_format, open_input, run_batch
+
+    fmt = args.format or guess_format(args.input)
+    source = open_input(args.input)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = run_batch(
+            source, out, fmt,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            index_path=args.index,
+            dataset_path=args.dataset,
+            min_popularity=args.min_popularity,
+            precision=args.precision,
+        )
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head). Point stdout at
+        # devnull so the interpreter's final flush does not fail too.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"Processed {count} queries", file=sys.stderr)
+    return 0
+
+
+def cmd_evaluate(args):
+    from evaluate import CONFIGURATIONS, format_report, run_evaluation
+
+    unknown = [c for c in args.config if c not in CONFIGURATIONS]
+    if unknown:
+        print(f" Unknown configuration(s): {', '.join(unknown)}. Choose from {', '.join(CONFIGURATIONS)}")
+        return 1
+    try:
+        results = run_evaluation(
+            args.dataset, args.min_popularity, args.truth,
+            configs=args.config or None,
+            queries=args.queries,
+            k=args.k,
+            workers=args.workers,
+        )
+    except ValueError as e:
+        print(f" {e}")
+        return 1
+    print(format_report(results, args.truth, args.k, args.queries))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nResults written to '{args.output}'")
+    return 0
+
+
+# ===============================
+# ARGUMENT PARSING
+# ===============================
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Music recommendation system")
+    parser.add_argument("--dataset", default="dataset.csv", help="source CSV (default: dataset.csv)")
+    parser.add_argument("--index", default="index", help="prebuilt index directory (default: index)")
+    parser.add_argument("--min-popularity", type=int, default=50,
+                        help="drop songs below this popularity when fitting (default: 50)")
+    parser.add_argument("--precision", choices=["float64", "float32", "float16", "int8"], default="float64",
+                        help="feature precision used for scoring; float16/int8 re-rank exactly (default: float64)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--two-stage", dest="two_stage", action="store_true", default=None,
+                       help="recommend from generated candidates with popularity/diversity re-ranking "
+                            "(default: candidates ranked by cosine only, when the index has IVF lists)")
+    group.add_argument("--exact", dest="two_stage", action="store_false",
+                       help="always scan the whole catalogue")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("similar", help="song-to-song recommendations")
+    p.add_argument("song")
+    p.add_argument("-n", type=int, default=5)
+    p.add_argument("--blend", type=float, default=0.0,
+                   help="weight of the collaborative model, 0-1 (default: 0, content only)")
+    p.set_defaults(func=cmd_similar)
+
+    p = sub.add_parser("mood", help="recommendations by genre and mood")
+    p.add_argument("genre")
+    p.add_argument("mood", help="happy/sad/energetic/chill")
+    p.add_argument("-n", type=int, default=5)
+    p.set_defaults(func=cmd_mood)
+
+    p = sub.add_parser("playlist", help="songs along a path through mood space")
+    p.add_argument("waypoints", nargs="+",
+                   help="moods to pass through, by name or as energy=..,valence=..[,tempo=..][,danceability=..]")
+    p.add_argument("-n", type=int, default=30, help="playlist length (default: 30)")
+    p.add_argument("--genre")
+    p.add_argument("--range", action="append", default=[], metavar="FEATURE=LOW:HIGH",
+                   help="only songs within these bounds, e.g. tempo=90:130 (repeatable)")
+    p.set_defaults(func=cmd_playlist)
+
+    p = sub.add_parser("live", help="search Spotify and match against the local dataset")
+    p.add_argument("query", nargs="?")
+    p.add_argument("-n", type=int, default=10)
+    p.set_defaults(func=cmd_live)
+
+    p = sub.add_parser("eda", help="plot audio feature distributions")
+    p.set_defaults(func=cmd_eda)
+
+    p = sub.add_parser("extract", help="estimate audio features for local files into the feature store")
+    p.add_argument("directory", help="folder of audio files ('Artist - Title.wav')")
+    p.add_argument("--store", default="feature_store.csv", help="feature store CSV (default: feature_store.csv)")
+    p.add_argument("--genre", default="local", help="genre recorded for the new tracks (default: local)")
+    p.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    p.set_defaults(func=cmd_extract)
+
+    p = sub.add_parser("build-index", help="fit the scaler and publish a new version of --index")
+    p.add_argument("--quantize", action="append", default=[], choices=["float32", "float16", "int8"],
+                   help="also store a reduced-precision copy for --precision (repeatable)")
+    p.add_argument("--ann", action="store_true",
+                   help="also build IVF lists for the two-stage pipeline (used by default once present)")
+    p.add_argument("--version", help="version name (default: build timestamp)")
+    p.add_argument("--no-activate", action="store_true", help="publish without making it the current version")
+    p.add_argument("--keep", type=int, default=3, help="versions to keep, including the current one (default: 3)")
+    p.set_defaults(func=cmd_build_index)
+
+    p = sub.add_parser("versions", help="list the versions of the index")
+    p.add_argument("--verify", action="store_true", help="check every file against its manifest checksum")
+    p.set_defaults(func=cmd_versions)
+
+    p = sub.add_parser("activate", help="switch the index to another version (e.g. roll back)")
+    p.add_argument("version")
+    p.set_defaults(func=cmd_activate)
+
+    p = sub.add_parser("train-cf", help="train the collaborative model on play logs")
+    p.add_argument("logs", help="CSV of plays, one row per (user, song)")
+    p.add_argument("--user-col", default="user")
+    p.add_argument("--song-col", default="song")
+    p.add_argument("--weight-col", default="plays", help="play counts; missing column counts 1 per row")
+    p.add_argument("--factors", type=int, default=64)
+    p.add_argument("--iterations", type=int, default=15)
+    p.add_argument("--regularization", type=float, default=0.05)
+    p.add_argument("--alpha", type=float, default=40.0)
+    p.add_argument("--threads", type=int, help="solver threads (default: CPU count)")
+    p.set_defaults(func=cmd_train_cf)
+
+    p = sub.add_parser("user", help="recommendations for a user of the play logs")
+    p.add_argument("user")
+    p.add_argument("-n", type=int, default=10)
+    p.add_argument("--blend", type=float, default=0.5,
+                   help="weight of the collaborative model, 0-1 (default: 0.5)")
+    p.set_defaults(func=cmd_user)
+
+    p = sub.add_parser("batch", help="answer JSONL/CSV queries in bulk, writing JSONL results")
+    p.add_argument("input", nargs="?", default="-", help="query file, '-' for stdin (default)")
+    p.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from extension, else jsonl)")
+    p.add_argument("-o", "--output", help="result file (default: stdout)")
+    p.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=1000, help="queries per chunk (default: 1000)")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("evaluate", help="compare engine configurations on held-out labels")
+    p.add_argument("--truth", choices=["genre", "artist", "album"], default="genre",
+                   help="label that defines a relevant recommendation (default: genre)")
+    p.add_argument("--config", action="append", default=[], metavar="NAME",
+                   help="configuration to evaluate, repeatable (default: all)")
+    p.add_argument("--queries", type=int, default=500, help="held-out query songs (default: 500)")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("-j", "--workers", type=int, help="configurations run in parallel (default: CPU count)")
+    p.add_argument("-o", "--output", help="also write the results as CSV")
+    p.set_defaults(func=cmd_evaluate)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
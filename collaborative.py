@@ -0,0 +1,240 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import unit_rows, top_k
+
+# ===============================
+# COLLABORATIVE FILTERING (IMPLICIT ALS)
+# ===============================
+# Play logs become a sparse users x songs matrix whose columns are the
+# engine's catalogue rows, so the learned item factors line up with the
+# content features and both can be scored and blended with the same top-k
+# code. Training follows Hu, Koren & Volinsky (2008): confidence
+# c = 1 + alpha * plays, and each half-step solves one small f x f system
+# per user (or item). Systems are built per block of rows and solved with a
+# single batched np.linalg.solve, with blocks spread over a thread pool.
+
+
+def load_interactions(path, engine, user_col="user", song_col="song", weight_col="plays",
+                      chunksize=1_000_000):
+    # Returns (user_ids, csr users x catalogue songs). Rows whose song is not
+    # in the catalogue, whose user is blank or whose play count is not
+    # positive are dropped; repeated (user, song) pairs are summed.
+    from scipy.sparse import csr_matrix
+
+    usecols = [user_col, song_col] + ([weight_col] if weight_col else [])
+    users, songs, weights = [], [], []
+
+    for chunk in pd.read_csv(path, usecols=lambda c: c in usecols, chunksize=chunksize,
+                             dtype={user_col: str, song_col: str}):
+        missing = [c for c in (user_col, song_col) if c not in chunk]
+        if missing:
+            raise ValueError(f"'{path}' has no {', '.join(repr(c) for c in missing)} column")
+        codes, titles = pd.factorize(chunk[song_col])
+        items = np.where(codes >= 0, engine.lookup_many(titles)[codes], -1)
+        if weight_col in chunk:
+            # A blank count is one play; zero or negative counts are no
+            # evidence at all (and would make the solve meaningless)
+            plays = chunk[weight_col].fillna(1).to_numpy(dtype=np.float32)
+        else:
+            plays = np.ones(len(chunk), dtype=np.float32)
+        found = (items >= 0) & (plays > 0) & chunk[user_col].notna().to_numpy()
+        users.append(chunk[user_col][found].astype("category"))
+        songs.append(items[found].astype(np.int32))
+        weights.append(plays[found])
+
+    if not users or not sum(len(s) for s in songs):
+        raise ValueError(f"No interactions with catalogue songs in '{path}'")
+    # Categories keep tens of millions of user ids cheap until the final merge
+    user_codes = pd.api.types.union_categoricals(users)
+    user_ids = np.asarray(user_codes.categories, dtype=str)
+    matrix = csr_matrix(
+        (np.concatenate(weights), (user_codes.codes.astype(np.int32), np.concatenate(songs))),
+        shape=(len(user_ids), len(engine)),
+        dtype=np.float32,
+    )
+    matrix.sum_duplicates()
+    return user_ids, matrix
+
+
+class ImplicitALS:
+    MODEL_FILE = "collaborative.npz"
+
+    def __init__(self, factors=64, regularization=0.05, alpha=40.0, iterations=15,
+                 threads=None, block_size=512, random_state=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.threads = threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self.random_state = random_state
+        self.user_ids = None
+        self.user_factors = None
+        self.item_factors = None
+        # Training matrix, kept to skip already-played songs and to build
+        # content profiles at serving time
+        self.user_items = None
+        # catalogue_id of the engine the model was trained against
+        self.catalogue = None
+        self._user_row = None
+        self._unit_items = None
+
+    def fit(self, user_ids, user_items, catalogue=None):
+        from threadpoolctl import threadpool_limits
+
+        rng = np.random.default_rng(self.random_state)
+        n_users, n_items = user_items.shape
+        self.user_ids = np.asarray(user_ids)
+        self.catalogue = catalogue
+        self.user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+        self._user_row = None
+        self._unit_items = None
+
+        user_items = user_items.tocsr()
+        self.user_items = user_items
+        item_users = user_items.T.tocsr()
+        # Our threads already use every core; nested BLAS threads would
+        # only fight over them
+        with threadpool_limits(1 if self.threads > 1 else None), \
+                ThreadPoolExecutor(self.threads) as pool:
+            for _ in range(self.iterations):
+                self._solve(pool, user_items, self.item_factors, self.user_factors)
+                self._solve(pool, item_users, self.user_factors, self.item_factors)
+        return self
+
+    def _solve(self, pool, matrix, fixed, target):
+        # Least-squares update of every row of target with fixed held constant
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        blocks = range(0, matrix.shape[0], self.block_size)
+        list(pool.map(lambda start: self._solve_block(matrix, fixed, target, gram, start), blocks))
+
+    def _solve_block(self, matrix, fixed, target, gram, start):
+        stop = min(start + self.block_size, matrix.shape[0])
+        indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+        A = np.broadcast_to(gram, (stop - start,) + gram.shape).copy()
+        b = np.zeros((stop - start, self.factors), dtype=np.float32)
+        for row in range(start, stop):
+            lo, hi = indptr[row], indptr[row + 1]
+            if lo == hi:
+                continue
+            Y = fixed[indices[lo:hi]]
+            confidence = self.alpha * data[lo:hi]
+            # YtCY = YtY + Yt(C - I)Y and Yt C p with p = 1 on observed items
+            A[row - start] += (Y.T * confidence) @ Y
+            b[row - start] = (confidence + 1.0) @ Y
+        target[start:stop] = np.linalg.solve(A, b[..., None])[..., 0]
+
+    # ----------------------------
+    # SERVING
+    # ----------------------------
+
+    def user_row(self, user_id):
+        if self._user_row is None:
+            self._user_row = {u: i for i, u in enumerate(self.user_ids)}
+        return self._user_row.get(str(user_id))
+
+    def user_scores(self, user_row):
+        return self.item_factors @ self.user_factors[user_row]
+
+    def item_scores(self, item_index):
+        if self._unit_items is None:
+            self._unit_items = unit_rows(self.item_factors)
+        return self._unit_items @ self._unit_items[item_index]
+
+    def check_catalogue(self, engine):
+        # Item factors are indexed by catalogue row, so the model only fits
+        # the catalogue it was trained against
+        if len(self.item_factors) != len(engine):
+            raise ValueError(
+                f"The collaborative model was trained on {len(self.item_factors)} songs but the "
+                f"catalogue has {len(engine)}; run 'python cli.py train-cf' again")
+        # Same size is not enough: a rebuilt or rolled-back index can put
+        # other songs on the same rows
+        if self.catalogue is not None and self.catalogue != engine.catalogue_id:
+            raise ValueError(
+                "The collaborative model was trained on a different version of the catalogue; "
+                "run 'python cli.py train-cf' again")
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.savez(
+            os.path.join(path, self.MODEL_FILE),
+            user_ids=self.user_ids,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            params=np.array([self.regularization, self.alpha]),
+            indptr=self.user_items.indptr,
+            indices=self.user_items.indices,
+            data=self.user_items.data,
+            catalogue=np.array(self.catalogue or ""),
+        )
+
+    @classmethod
+    def load(cls, path):
+        from scipy.sparse import csr_matrix
+
+        with np.load(os.path.join(path, cls.MODEL_FILE)) as saved:
+            model = cls(factors=saved["user_factors"].shape[1],
+                        regularization=float(saved["params"][0]),
+                        alpha=float(saved["params"][1]))
+            model.user_ids = saved["user_ids"]
+            # Models saved before the catalogue was recorded only get the size check
+            model.catalogue = (str(saved["catalogue"]) or None) if "catalogue" in saved else None
+            model.user_factors = saved["user_factors"]
+            model.item_factors = saved["item_factors"]
+            model.user_items = csr_matrix(
+                (saved["data"], saved["indices"], saved["indptr"]),
+                shape=(len(model.user_factors), len(model.item_factors)),
+            )
+        return model
+
+
+# ----------------------------
+# CONTENT + COLLABORATIVE BLEND
+# ----------------------------
+
+def _rescale(scores):
+    # Map scores onto [0, 1] so the two models are comparable
+    lo, hi = scores.min(), scores.max()
+    if hi == lo:
+        return np.zeros_like(scores, dtype=float)
+    return (scores - lo) / (hi - lo)
+
+
+def blend_scores(content, collab, weight):
+    # weight = 0 -> pure content, 1 -> pure collaborative
+    return (1 - weight) * _rescale(content) + weight * _rescale(collab)
+
+
+def similar_blended(engine, model, song_name, n=5, weight=0.5):
+    model.check_catalogue(engine)
+    song_index = engine.lookup(song_name)
+    if song_index is None:
+        return None, None
+    content = engine.unit_features @ engine.unit_features[song_index]
+    scores = blend_scores(content, model.item_scores(song_index), weight)
+    # The song itself always scores highest on both models
+    scores[song_index] = -np.inf
+    idx = top_k(scores, n)
+    return song_index, engine.rows(idx, scores[idx])
+
+
+def recommend_for_user(engine, model, user_id, n=10, weight=0.5):
+    # Collaborative scores blended with the cosine similarity to the user's
+    # play-weighted average song. Songs already played are left out.
+    model.check_catalogue(engine)
+    user_row = model.user_row(user_id)
+    if user_row is None:
+        return None
+    played = model.user_items[user_row]
+    profile = played.data @ engine.unit_features[played.indices]
+    content = engine.unit_features @ unit_rows(profile[None, :])[0]
+    scores = blend_scores(content, model.user_scores(user_row), weight)
+    scores[played.indices] = -np.inf
+    idx = top_k(scores, n)
+    return engine.rows(idx, scores[idx])
@@ -0,0 +1,523 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------
+# SHARED DATA + SCORING
+# ----------------------------
+# Heavy libraries (sklearn, spotipy, matplotlib) are imported where they are
+# used so that importing this module stays cheap.
+
+FEATURES = ["danceability", "energy", "tempo", "valence"]
+
+# Locally extracted audio features, same columns as dataset.csv
+FEATURE_STORE = "feature_store.csv"
+
+mood_mapping = {
+    "happy": {"energy": 0.8, "valence": 0.9},
+    "sad": {"energy": 0.3, "valence": 0.2},
+    "energetic": {"energy": 0.9, "valence": 0.7},
+    "chill": {"energy": 0.4, "valence": 0.5}
+}
+
+
+def mood_target(spec):
+    # A preset mood name or a {feature: value} dict in raw units (energy and
+    # valence 0-1, tempo in BPM). Energy and valence are required.
+    if isinstance(spec, str):
+        if spec.lower() not in mood_mapping:
+            raise ValueError(f"Unknown mood '{spec}'. Choose from {', '.join(mood_mapping)}")
+        return dict(mood_mapping[spec.lower()])
+    target = {f: float(v) for f, v in spec.items() if v is not None}
+    unknown = set(target) - set(FEATURES)
+    if unknown:
+        raise ValueError(f"Unknown mood feature(s): {', '.join(sorted(unknown))}")
+    if "energy" not in target or "valence" not in target:
+        raise ValueError("A mood needs at least an energy and a valence value")
+    return target
+
+
+def _select_columns(df, keep=()):
+    # keep: extra dataset.csv columns carried through under their own names
+    df = df[[
+        "track_name",
+        "artists",
+        "track_genre",
+        "popularity",
+        "danceability",
+        "energy",
+        "tempo",
+        "valence"
+    ] + list(keep)]
+    df.columns = ["song", "artist", "genre", "popularity", "danceability", "energy", "tempo", "valence"] + list(keep)
+    return df
+
+
+def load_dataset(path="dataset.csv", min_popularity=50, feature_store=FEATURE_STORE, keep=()):
+    df = _select_columns(pd.read_csv(path), keep)
+    df = df.dropna()
+    if min_popularity is not None:
+        df = df[df["popularity"] >= min_popularity]
+    # Tracks analysed locally (audio_features.py) have no popularity score
+    # and are always kept
+    if feature_store and os.path.exists(feature_store):
+        local = _select_columns(pd.read_csv(feature_store))
+        local = local.assign(popularity=local["popularity"].fillna(0)).dropna()
+        df = pd.concat([df, local])
+    df = df.reset_index(drop=True)
+    df["song_clean"] = df["song"].str.lower().str.strip()
+    return df
+
+
+def top_k(scores, k):
+    # Indices of the k highest scores, best first (ties keep dataset order)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+def top_k_rows(scores, k):
+    # Row-wise top_k for a (queries x songs) score matrix
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.intp)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.lexsort((idx, -part), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+CATALOGUE_COLUMNS = ["song", "artist", "genre", "popularity"] + FEATURES
+STRING_COLUMNS = ["song", "artist", "genre"]
+LOOKUP_ARRAYS = ["song_hashes", "song_rows", "artist_hashes", "artist_rows", "genre_order", "genre_offsets"]
+
+
+def _clean(values):
+    return pd.Series(values, dtype=object).str.lower().str.strip().to_numpy(dtype=object)
+
+
+def _hash(values):
+    # Stable across processes, unlike hash()
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+class StringColumn:
+    # Strings packed as one UTF-8 byte buffer plus offsets. Both arrays can be
+    # memory-mapped, so processes share them instead of each building
+    # millions of Python str objects; values are decoded only when read.
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _decode(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __getitem__(self, idx):
+        if np.ndim(idx) == 0:
+            return self._decode(idx)
+        out = np.empty(len(idx), dtype=object)
+        out[:] = [self._decode(i) for i in idx]
+        return out
+
+    def to_numpy(self):
+        return self[np.arange(len(self))]
+
+
+class RecommendationEngine:
+    # Files written by save() / read by load(). Every array is a plain .npy
+    # file so load() can memory-map it: worker processes on one machine then
+    # share a single copy of the catalogue through the page cache.
+    FEATURES_FILE = "features.npy"
+    UNIT_FILE = "unit_features.npy"
+    SCALER_FILE = "scaler.npz"
+    LOOKUP_FILE = "lookups.npz"
+    # Upper bound on the score matrix cells held at once by search()
+    BLOCK_CELLS = 1 << 22
+
+    def __init__(self, df):
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler()
+        self.scaled_features = scaler.fit_transform(df[FEATURES])
+        self.mean = scaler.mean_
+        self.scale = scaler.scale_
+        self.columns = {c: df[c].to_numpy() for c in CATALOGUE_COLUMNS}
+        self._df = df
+        self._song_options = None
+        self._catalogue_id = None
+        self.scorer = None
+        self.pipeline = None
+        # Pre-normalised rows turn cosine similarity into a single dot product
+        self.unit_features = unit_rows(self.scaled_features)
+        self._build_lookups()
+
+    def _build_lookups(self):
+        # Cleaned titles sorted by hash; a stable sort keeps the rows of equal
+        # titles in dataset order, so lookup() finds the first one like
+        # df[df["song_clean"] == name].index[0]
+        hashes = _hash(_clean(self.columns["song"]))
+        order = np.argsort(hashes, kind="stable")
+        self.song_hashes = hashes[order]
+        self.song_rows = order
+
+        # Same layout for artists, used to find an artist's other songs
+        hashes = _hash(_clean(self.columns["artist"]))
+        order = np.argsort(hashes, kind="stable")
+        self.artist_hashes = hashes[order]
+        self.artist_rows = order
+
+        # Rows grouped by lower-cased genre: genre_order[genre_offsets[g]:genre_offsets[g + 1]]
+        codes, names = pd.factorize(_clean(self.columns["genre"]))
+        self.genre_order = np.argsort(codes, kind="stable")
+        self.genre_offsets = np.searchsorted(codes[self.genre_order], np.arange(len(names) + 1))
+        self.genre_keys = list(names)
+        self.genres = list(pd.unique(self.columns["genre"]))
+        self._index_genres()
+
+    def _index_genres(self):
+        self.genre_index = {
+            name: self.genre_order[self.genre_offsets[g]:self.genre_offsets[g + 1]]
+            for g, name in enumerate(self.genre_keys)
+        }
+
+    def __len__(self):
+        return len(self.scaled_features)
+
+    def save(self, path, precisions=(), ann=False):
+        os.makedirs(path, exist_ok=True)
+        if precisions:
+            from quantize import QuantizedScorer
+            for precision in precisions:
+                QuantizedScorer.build(self.unit_features, precision).save(path)
+        if ann:
+            from pipeline import IVFIndex
+            IVFIndex.build(self.unit_features).save(path)
+        np.save(os.path.join(path, self.FEATURES_FILE), self.scaled_features)
+        np.save(os.path.join(path, self.UNIT_FILE), self.unit_features)
+        np.savez(os.path.join(path, self.SCALER_FILE), mean=self.mean, scale=self.scale)
+        for name, values in self.columns.items():
+            if name in STRING_COLUMNS:
+                column = values if isinstance(values, StringColumn) else StringColumn.from_values(values)
+                np.save(os.path.join(path, f"{name}.data.npy"), column.data)
+                np.save(os.path.join(path, f"{name}.offsets.npy"), column.offsets)
+            else:
+                np.save(os.path.join(path, f"{name}.npy"), np.asarray(values))
+        for name in LOOKUP_ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        np.savez(
+            os.path.join(path, self.LOOKUP_FILE),
+            genre_keys=np.array(self.genre_keys, dtype=str),
+            genres=np.array(self.genres, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # With mmap=True nothing large is copied into this process: arrays
+        # are paged in from the OS cache on first touch and shared read-only.
+        mode = "r" if mmap else None
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+
+        engine = cls.__new__(cls)
+        engine.scaled_features = array("features")
+        engine.unit_features = array("unit_features")
+        with np.load(os.path.join(path, cls.SCALER_FILE)) as scaler:
+            engine.mean = scaler["mean"]
+            engine.scale = scaler["scale"]
+        engine.columns = {}
+        for name in CATALOGUE_COLUMNS:
+            if name in STRING_COLUMNS:
+                engine.columns[name] = StringColumn(array(f"{name}.data"), array(f"{name}.offsets"))
+            else:
+                engine.columns[name] = array(name)
+        for name in LOOKUP_ARRAYS:
+            setattr(engine, name, array(name))
+        with np.load(os.path.join(path, cls.LOOKUP_FILE)) as lookups:
+            engine.genre_keys = [str(g) for g in lookups["genre_keys"]]
+            engine.genres = [str(g) for g in lookups["genres"]]
+        engine._index_genres()
+        engine._df = None
+        engine._song_options = None
+        engine._catalogue_id = None
+        engine.scorer = None
+        engine.pipeline = None
+        engine.index_path = path
+        return engine
+
+    def set_precision(self, precision="float64"):
+        # Score with a reduced-precision copy of the features (see
+        # quantize.py). float64 is the exact default. A copy saved in the
+        # index by save(..., precision) is memory-mapped instead of rebuilt.
+        if precision == "float64":
+            self.scorer = None
+            return self
+        from quantize import QuantizedScorer
+
+        path = getattr(self, "index_path", None)
+        if path and QuantizedScorer.exists(path, precision):
+            self.scorer = QuantizedScorer.load(path, precision)
+        else:
+            self.scorer = QuantizedScorer.build(self.unit_features, precision)
+        return self
+
+    def set_pipeline(self, two_stage=True, **options):
+        # Serve similar(), by_mood() and from_vector() through the candidate
+        # generation + re-ranking pipeline in pipeline.py instead of a full
+        # scan. IVF lists saved in the index by save(..., ann=True) are
+        # memory-mapped instead of rebuilt.
+        if not two_stage:
+            self.pipeline = None
+            return self
+        from pipeline import IVFIndex, TwoStagePipeline
+
+        path = getattr(self, "index_path", None)
+        ann = IVFIndex.load(path) if path and IVFIndex.exists(path) else IVFIndex.build(self.unit_features)
+        self.pipeline = TwoStagePipeline(self, ann, **options)
+        return self
+
+    @property
+    def df(self):
+        # The full catalogue as a DataFrame. Built on first use, so processes
+        # that only score queries never materialise it.
+        if self._df is None:
+            df = pd.DataFrame({
+                name: values.to_numpy() if isinstance(values, StringColumn) else np.asarray(values)
+                for name, values in self.columns.items()
+            })
+            df["song_clean"] = df["song"].str.lower().str.strip()
+            self._df = df
+        return self._df
+
+    @property
+    def song_options(self):
+        # Straight from the song column, so the app's default page does not
+        # materialise the whole catalogue as a DataFrame in every process
+        if self._song_options is None:
+            songs = self.columns["song"]
+            self._song_options = pd.unique(songs.to_numpy() if isinstance(songs, StringColumn) else songs)
+        return self._song_options
+
+    @property
+    def catalogue_id(self):
+        # Fingerprint of which title sits on which row. Anything indexed by
+        # catalogue row (e.g. collaborative item factors) is only valid for
+        # a catalogue with the same id, whichever index version it came from.
+        if self._catalogue_id is None:
+            digest = hashlib.sha256()
+            digest.update(np.ascontiguousarray(self.song_hashes).tobytes())
+            digest.update(np.ascontiguousarray(self.song_rows, dtype=np.int64).tobytes())
+            self._catalogue_id = digest.hexdigest()
+        return self._catalogue_id
+
+    def transform(self, vectors):
+        return (np.asarray(vectors, dtype=float) - self.mean) / self.scale
+
+    def lookup(self, song_name):
+        key = song_name.lower().strip()
+        h = _hash([key])[0]
+        lo, hi = np.searchsorted(self.song_hashes, h, "left"), np.searchsorted(self.song_hashes, h, "right")
+        for row in self.song_rows[lo:hi]:
+            if self.columns["song"][row].lower().strip() == key:
+                return int(row)
+        return None
+
+    def artist_songs(self, row):
+        # Rows by the same artist as row (including row itself)
+        h = _hash(_clean([self.columns["artist"][row]]))[0]
+        lo = np.searchsorted(self.artist_hashes, h, "left")
+        hi = np.searchsorted(self.artist_hashes, h, "right")
+        return self.artist_rows[lo:hi]
+
+    def lookup_many(self, song_names):
+        # Vectorised lookup(); -1 where a title is not in the catalogue
+        keys = _clean(song_names)
+        hashes = _hash(keys)
+        pos = np.minimum(np.searchsorted(self.song_hashes, hashes), len(self.song_hashes) - 1)
+        found = self.song_hashes[pos] == hashes
+        rows = np.where(found, self.song_rows[pos], -1)
+        # Confirm the text; on the (rare) hash collision fall back to lookup()
+        check = np.flatnonzero(found)
+        wrong = check[_clean(self.columns["song"][rows[check]]) != keys[check]]
+        for i in wrong:
+            row = self.lookup(keys[i])
+            rows[i] = -1 if row is None else row
+        return rows
+
+    def rows(self, idx, scores=None):
+        idx = np.asarray(idx, dtype=np.intp)
+        recs = pd.DataFrame({name: values[idx] for name, values in self.columns.items()}, index=idx)
+        if scores is not None:
+            recs["similarity"] = scores
+        return recs
+
+    def similar(self, song_name, n=5):
+        song_index = self.lookup(song_name)
+        if song_index is None:
+            return None, None
+        return song_index, self.neighbours(song_index, n)
+
+    def neighbours(self, song_index, n=5):
+        # The n songs most similar to catalogue row song_index
+        if self.pipeline is not None:
+            query = unit_rows(self.scaled_features[[song_index]])[0]
+            indices, scores = self.pipeline.recommend(query, n, seed=song_index)
+            return self.rows(indices, scores)
+        indices, scores = self.search(self.scaled_features[[song_index]], n + 1)
+        # The best match is the song itself, so skip it like .iloc[1:n+1]
+        return self.rows(indices[0, 1:], scores[0, 1:])
+
+    def mood_vector(self, rows, mood):
+        # Danceability is fixed at 0.5 and tempo at the genre average
+        return [
+            0.5,
+            mood_mapping[mood]["energy"],
+            self.columns["tempo"][rows].mean(),
+            mood_mapping[mood]["valence"]
+        ]
+
+    def by_mood(self, genre, mood, n=5):
+        rows = self.genre_index.get(genre.lower())
+        if rows is None or mood not in mood_mapping:
+            return None
+        query = self.transform([self.mood_vector(rows, mood)])
+        if self.pipeline is not None:
+            code = self.genre_keys.index(genre.lower())
+            indices, scores = self.pipeline.recommend(unit_rows(query)[0], n, genre=code)
+            return self.rows(indices, scores)
+        indices, scores = self.search(query, n, rows=rows)
+        return self.rows(indices[0], scores[0])
+
+    def filter_rows(self, genre=None, ranges=None):
+        # Row indices inside a genre and within {feature: (low, high)} bounds
+        # (raw units, either bound may be None). None if the genre is unknown.
+        mask = np.ones(len(self), dtype=bool)
+        if genre:
+            rows = self.genre_index.get(genre.lower())
+            if rows is None:
+                return None
+            mask[:] = False
+            mask[rows] = True
+        for feature, (low, high) in (ranges or {}).items():
+            if feature not in FEATURES:
+                raise ValueError(f"Cannot filter on '{feature}'")
+            values = self.columns[feature]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return np.flatnonzero(mask)
+
+    def mood_playlist(self, waypoints, n=10, genre=None, ranges=None):
+        # n songs following a path through mood space, e.g. ["chill",
+        # "energetic"] starts chill and ends energetic. Each waypoint is a
+        # mood_target() spec; only the features given in every waypoint are
+        # matched, and the waypoints are spread evenly over the playlist.
+        # A single waypoint simply returns the n nearest songs.
+        targets = [mood_target(w) for w in waypoints]
+        dims = [f for f in FEATURES if all(f in t for t in targets)]
+        cols = [FEATURES.index(f) for f in dims]
+        points = np.array([[t[f] for f in dims] for t in targets])
+        steps = np.linspace(0, 1, n)
+        if len(points) == 1:
+            path = np.repeat(points, n, axis=0)
+        else:
+            anchors = np.linspace(0, 1, len(points))
+            path = np.column_stack([np.interp(steps, anchors, points[:, j]) for j in range(len(dims))])
+        path = (path - self.mean[cols]) / self.scale[cols]
+
+        rows = self.filter_rows(genre, ranges)
+        if rows is None:
+            return None
+        candidates = self.scaled_features[rows][:, cols]
+
+        # Squared distance from every step of the path to every candidate
+        dist = (
+            (path ** 2).sum(axis=1)[:, None]
+            - 2 * path @ candidates.T
+            + (candidates ** 2).sum(axis=1)[None, :]
+        )
+        # n nearest per step always leaves one not picked by an earlier step
+        nearest = top_k_rows(-dist, n)
+        picked, picked_dist, used = [], [], set()
+        for step, options in enumerate(nearest):
+            for j in options:
+                if j not in used:
+                    used.add(j)
+                    picked.append(j)
+                    picked_dist.append(dist[step, j])
+                    break
+        similarity = 1 / (1 + np.sqrt(np.maximum(picked_dist, 0)))
+        return self.rows(rows[np.array(picked, dtype=np.intp)], similarity)
+
+    def search(self, queries, k, rows=None):
+        # Top-k cosine matches for many scaled query vectors at once,
+        # optionally restricted to a subset of rows. Returns (indices, scores).
+        queries = unit_rows(np.atleast_2d(queries))
+        if self.scorer is not None:
+            return self.scorer.search(queries, k, rows)
+        candidates = self.unit_features if rows is None else self.unit_features[rows]
+        k = min(k, len(candidates))
+        indices = np.empty((len(queries), k), dtype=np.intp)
+        scores = np.empty((len(queries), k))
+        step = max(1, self.BLOCK_CELLS // max(len(candidates), 1))
+        for start in range(0, len(queries), step):
+            block = queries[start:start + step] @ candidates.T
+            best = top_k_rows(block, k)
+            indices[start:start + step] = best
+            scores[start:start + step] = np.take_along_axis(block, best, axis=1)
+        if rows is not None:
+            indices = rows[indices]
+        return indices, scores
+
+    def from_vector(self, vector, n=5):
+        query = self.transform([vector])
+        if self.pipeline is not None:
+            indices, scores = self.pipeline.recommend(unit_rows(query)[0], n)
+            return self.rows(indices, scores)
+        indices, scores = self.search(query, n)
+        return self.rows(indices[0], scores[0])
+
+
+def load_engine(index_path="index", dataset_path="dataset.csv", min_popularity=50, precision="float64",
+                two_stage=None):
+    # Use the prebuilt index when it exists, otherwise fit from the CSV.
+    # two_stage=None turns the two-stage pipeline on, ranking by cosine only,
+    # when the index was built with IVF lists (build-index --ann);
+    # two_stage=True also applies its popularity and diversity re-ranking.
+    # A versioned index (artifacts.py) loads the version CURRENT points at.
+    from artifacts import resolve_index
+
+    index_path = resolve_index(index_path)
+    if index_path and os.path.exists(os.path.join(index_path, RecommendationEngine.LOOKUP_FILE)):
+        engine = RecommendationEngine.load(index_path)
+    else:
+        engine = RecommendationEngine(load_dataset(dataset_path, min_popularity))
+    options = {}
+    if two_stage is None:
+        from pipeline import IVFIndex
+        two_stage = bool(getattr(engine, "index_path", None)) and IVFIndex.exists(engine.index_path)
+        # Switched on by the index rather than asked for, so rank by cosine
+        # alone, like the full scan
+        options = {"popularity_weight": 0.0, "diversity": 0.0}
+    return engine.set_precision(precision).set_pipeline(two_stage, **options)
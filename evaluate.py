@@ -0,0 +1,181 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import RecommendationEngine, load_dataset
+
+# ===============================
+# OFFLINE EVALUATION
+# ===============================
+# Measures song-to-song recommendation quality for several engine
+# configurations against labels from dataset.csv:
+#   genre  - songs of the same genre are relevant
+#   artist - songs by the same artist are relevant
+#   album  - songs on the same album (same artist + album name) are relevant
+# A random sample of songs serves as queries. For genre and artist, their
+# labels are replaced in the catalogue the engine is fitted on, so nothing
+# that reads those columns (the two-stage genre/artist generators) can see
+# the answer. Quality (precision@k, recall@k, NDCG@k) is computed for the
+# configurations in parallel processes sharing one memory-mapped index;
+# latency is then timed one configuration at a time, so runs do not slow
+# each other down. Configurations no other one beats on both latency and
+# NDCG form the frontier.
+
+TRUTHS = ("genre", "artist", "album")
+HIDDEN = "(held out)"
+
+# Engine settings per configuration: "precision" goes to set_precision(),
+# "two_stage" and the rest to set_pipeline()
+CONFIGURATIONS = {
+    "exact": {},
+    "float32": {"precision": "float32"},
+    "float16": {"precision": "float16"},
+    "int8": {"precision": "int8"},
+    "two-stage": {"two_stage": True},
+    "two-stage-cosine": {"two_stage": True, "popularity_weight": 0.0, "diversity": 0.0},
+    "two-stage-probe4": {"two_stage": True, "n_probe": 4},
+    "two-stage-probe16": {"two_stage": True, "n_probe": 16},
+    "two-stage-diverse": {"two_stage": True, "diversity": 0.3},
+}
+
+LABELS_FILE = "eval_labels.npy"
+SEEDS_FILE = "eval_seeds.npy"
+
+
+def hold_out(df, truth, queries, random_state=0):
+    # Returns (catalogue with the query labels hidden, label code per row,
+    # query rows). Only songs with at least one other relevant song are
+    # used as queries.
+    if truth == "album":
+        key = df["artist"].astype(str) + "\x00" + df["album_name"].astype(str)
+    else:
+        key = df[truth]
+    labels, _ = pd.factorize(key)
+    sizes = np.bincount(labels)
+    eligible = np.flatnonzero(sizes[labels] > 1)
+    if len(eligible) == 0:
+        raise ValueError(f"No song shares its {truth} with another song")
+    rng = np.random.default_rng(random_state)
+    seeds = np.sort(rng.choice(eligible, min(queries, len(eligible)), replace=False))
+    if truth in ("genre", "artist"):
+        df = df.copy()
+        df.iloc[seeds, df.columns.get_loc(truth)] = HIDDEN
+    return df, labels.astype(np.int32), seeds
+
+
+def ranking_metrics(found, seeds, labels, k):
+    # found: (queries x k) recommended rows, -1 where fewer than k came back
+    sizes = np.bincount(labels)
+    relevant = sizes[labels[seeds]] - 1
+    hits = (found >= 0) & (found != seeds[:, None]) \
+        & (labels[np.maximum(found, 0)] == labels[seeds][:, None])
+    discount = 1 / np.log2(np.arange(2, k + 2))
+    ideal = np.cumsum(discount)[np.minimum(relevant, k) - 1]
+    return {
+        "precision": float(np.mean(hits.sum(axis=1) / k)),
+        "recall": float(np.mean(hits.sum(axis=1) / relevant)),
+        "ndcg": float(np.mean((hits @ discount) / ideal)),
+    }
+
+
+def _configure(options, index_path, threads=None):
+    options = dict(options)
+    engine = RecommendationEngine.load(index_path)
+    engine.set_precision(options.pop("precision", "float64"))
+    two_stage = options.pop("two_stage", False)
+    if two_stage and threads:
+        options["threads"] = threads
+    return engine.set_pipeline(two_stage, **options)
+
+
+def evaluate_quality(name, options, index_path, k, blas_threads=None):
+    # Ranking metrics only; safe to run several configurations at once
+    if blas_threads:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(blas_threads)
+    engine = _configure(options, index_path, threads=blas_threads)
+    labels = np.load(os.path.join(index_path, LABELS_FILE))
+    seeds = np.load(os.path.join(index_path, SEEDS_FILE))
+    found = np.full((len(seeds), k), -1, dtype=np.intp)
+    for i, seed in enumerate(seeds):
+        recs = engine.neighbours(seed, k)
+        found[i, :len(recs)] = recs.index
+    return {"config": name, **ranking_metrics(found, seeds, labels, k)}
+
+
+def time_config(options, index_path, k, warmup=10):
+    # Per-query latency with the configuration's normal threading. Run one
+    # configuration at a time: concurrent runs would measure contention.
+    engine = _configure(options, index_path)
+    seeds = np.load(os.path.join(index_path, SEEDS_FILE))
+    # Page in the index and fill lazy caches before timing
+    for seed in seeds[:warmup]:
+        engine.neighbours(seed, k)
+    times = np.empty(len(seeds))
+    for i, seed in enumerate(seeds):
+        start = time.perf_counter()
+        engine.neighbours(seed, k)
+        times[i] = time.perf_counter() - start
+    return {
+        "ms_per_query": float(times.mean() * 1000),
+        "p95_ms": float(np.percentile(times, 95) * 1000),
+    }
+
+
+def frontier(results):
+    # Configurations with a higher NDCG than every faster one
+    ordered = results.sort_values(["ms_per_query", "ndcg"], ascending=[True, False])
+    best = np.maximum.accumulate(ordered["ndcg"].to_numpy())
+    on_front = np.r_[True, ordered["ndcg"].to_numpy()[1:] > best[:-1]]
+    return ordered.assign(frontier=on_front).reset_index(drop=True)
+
+
+def run_evaluation(dataset_path="dataset.csv", min_popularity=50, truth="genre", configs=None,
+                   queries=500, k=10, workers=None, random_state=0):
+    # Returns one row of metrics per configuration, fastest first
+    if truth not in TRUTHS:
+        raise ValueError(f"Unknown truth '{truth}'. Choose from {', '.join(TRUTHS)}")
+    configs = list(configs or CONFIGURATIONS)
+    unknown = [c for c in configs if c not in CONFIGURATIONS]
+    if unknown:
+        raise ValueError(f"Unknown configuration(s): {', '.join(unknown)}")
+
+    keep = ("album_name",) if truth == "album" else ()
+    df = load_dataset(dataset_path, min_popularity, feature_store=None, keep=keep)
+    df, labels, seeds = hold_out(df, truth, queries, random_state)
+    precisions = sorted({CONFIGURATIONS[c]["precision"] for c in configs if "precision" in CONFIGURATIONS[c]})
+    ann = any(CONFIGURATIONS[c].get("two_stage") for c in configs)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(configs)))
+
+    with tempfile.TemporaryDirectory(prefix="eval_index_") as path:
+        RecommendationEngine(df).save(path, precisions, ann=ann)
+        np.save(os.path.join(path, LABELS_FILE), labels)
+        np.save(os.path.join(path, SEEDS_FILE), seeds)
+        # Quality in parallel, one thread per worker; latency afterwards,
+        # one configuration at a time in this process
+        blas_threads = 1 if workers > 1 else None
+        with ProcessPoolExecutor(workers) as pool:
+            jobs = [pool.submit(evaluate_quality, c, CONFIGURATIONS[c], path, k, blas_threads) for c in configs]
+            results = [job.result() for job in jobs]
+        for row in results:
+            row.update(time_config(CONFIGURATIONS[row["config"]], path, k))
+    return frontier(pd.DataFrame(results))
+
+
+def format_report(results, truth, k, queries):
+    lines = [
+        f"Held-out {truth} labels, {queries} queries, k={k}",
+        "* = on the latency / NDCG frontier",
+        "",
+    ]
+    for row in results.itertuples():
+        lines.append(
+            f"{'*' if row.frontier else ' '} {row.config:<20}"
+            f" P@{k} {row.precision:.4f}  R@{k} {row.recall:.4f}  NDCG@{k} {row.ndcg:.4f}"
+            f"  {row.ms_per_query:7.2f} ms/query (p95 {row.p95_ms:.2f})"
+        )
+    return "\n".join(lines)
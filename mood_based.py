@@ -1,6 +1,9 @@
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
+
+from engine import mood_mapping
+
 df = pd.read_csv("dataset.csv")
 
 df = df[[
@@ -18,12 +21,6 @@ df.columns = ["song", "artist", "genre", "danceability", "energy", "tempo", "val
 df.dropna(inplace=True)
 df.reset_index(drop=True, inplace=True)
 
-mood_mapping = {
-    "happy": {"energy": 0.8, "valence": 0.9},
-    "sad": {"energy": 0.3, "valence": 0.2},
-    "energetic": {"energy": 0.9, "valence": 0.7},
-    "chill": {"energy": 0.4, "valence": 0.5}
-}   
 user_genre = input("Enter genre: ")
 user_mood = input("Enter mood (happy/sad/energetic/chill): ").lower()
 genre_df = df[df["genre"].str.lower() == user_genre.lower()]
@@ -1,10 +1,11 @@
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
-import pandas as pd
 import sys
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
 
+from engine import load_dataset
+
 # ----------------------------
 # Encoding Fix (Windows)
 # ----------------------------
@@ -14,29 +15,10 @@ if sys.stdout.encoding != 'utf-8':
 # ----------------------------
 # LOAD DATASET
 # ----------------------------
-df = pd.read_csv("dataset.csv")
-
-df = df[[
-    "track_name",
-    "artists",
-    "track_genre",
-    "popularity",
-    "danceability",
-    "energy",
-    "tempo",
-    "valence"
-]]
-
-df.columns = [
-    "song", "artist", "genre", "popularity",
-    "danceability", "energy", "tempo", "valence"
-]
-
-df.dropna(inplace=True)
-df.reset_index(drop=True, inplace=True)
+# Whole dataset plus any locally analysed tracks (python cli.py extract)
+df = load_dataset("dataset.csv", min_popularity=None)
 
 # Clean text for matching
-df["song_clean"] = df["song"].str.lower().str.strip()
 df["artist_clean"] = df["artist"].str.lower().str.strip()
 
 # ----------------------------
@@ -110,6 +92,7 @@ while True:
 
     if matches.empty:
         print("❌ Song not found in dataset for feature comparison.")
+        print("💡 Add the audio file with 'python cli.py extract <folder>' to score it locally.")
         continue
 
     song_index = matches.index[0]
@@ -0,0 +1,193 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from engine import top_k
+
+# ===============================
+# TWO-STAGE RECOMMENDATION
+# ===============================
+# Instead of scoring every song for every query, cheap generators each
+# propose a few hundred candidate rows:
+#   ann     - nearest songs from the few IVF lists closest to the query
+#   genre   - nearest songs within the seed's (or requested) genre
+#   popular - the most popular songs overall (or within the genre)
+#   artist  - other songs by the seed's artist
+# They run in parallel, and a re-ranker scores only their union with
+# cosine similarity, a popularity bonus and an MMR diversity penalty.
+# Per-query work depends on the list and shortlist sizes, not on the size
+# of the catalogue.
+
+
+class IVFIndex:
+    # Inverted file: songs grouped by nearest k-means centroid, stored in CSR
+    # form as members[offsets[c]:offsets[c + 1]] for list c
+    CENTROIDS_FILE = "ivf_centroids.npy"
+    OFFSETS_FILE = "ivf_offsets.npy"
+    MEMBERS_FILE = "ivf_members.npy"
+    # Songs assigned to centroids per block while building
+    BLOCK_ROWS = 1 << 16
+
+    def __init__(self, centroids, offsets, members):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.members = members
+
+    @classmethod
+    def build(cls, unit_features, n_lists=None, sample=100_000, random_state=0):
+        # k-means on a sample is enough to place the centroids; every song is
+        # then assigned to its closest one. ~sqrt(N) lists keeps both the
+        # centroid scan and each list short.
+        from sklearn.cluster import MiniBatchKMeans
+
+        n = len(unit_features)
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(random_state)
+        fit_rows = np.sort(rng.choice(n, min(n, sample), replace=False))
+        kmeans = MiniBatchKMeans(n_lists, random_state=random_state, n_init=3)
+        kmeans.fit(np.asarray(unit_features[fit_rows], dtype=np.float32))
+        centroids = kmeans.cluster_centers_
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignment = np.empty(n, dtype=np.int32)
+        for start in range(0, n, cls.BLOCK_ROWS):
+            block = np.asarray(unit_features[start:start + cls.BLOCK_ROWS], dtype=np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        members = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[members], np.arange(n_lists + 1))
+        return cls(centroids, offsets, members)
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, cls.MEMBERS_FILE))
+
+    def save(self, path):
+        np.save(os.path.join(path, self.CENTROIDS_FILE), self.centroids)
+        np.save(os.path.join(path, self.OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(path, self.MEMBERS_FILE), self.members)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mode = "r" if mmap else None
+        return cls(
+            np.load(os.path.join(path, cls.CENTROIDS_FILE)),
+            np.load(os.path.join(path, cls.OFFSETS_FILE)),
+            np.load(os.path.join(path, cls.MEMBERS_FILE), mmap_mode=mode),
+        )
+
+    def probe(self, query, n_probe):
+        # Rows in the n_probe lists whose centroids are closest to query
+        lists = top_k(self.centroids @ query, min(n_probe, len(self.centroids)))
+        return np.concatenate([self.members[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+
+class TwoStagePipeline:
+    # Largest slice of a genre scanned by the genre generator; bigger genres
+    # are sampled evenly down to this size
+    GENRE_SCAN = 20_000
+
+    def __init__(self, engine, ann, per_source=200, n_probe=8,
+                 popularity_weight=0.05, diversity=0.1, threads=4):
+        self.engine = engine
+        self.ann = ann
+        self.per_source = per_source
+        self.n_probe = n_probe
+        self.popularity_weight = popularity_weight
+        self.diversity = diversity
+        self._pool = ThreadPoolExecutor(threads)
+
+        popularity = np.asarray(engine.columns["popularity"], dtype=float)
+        self._popularity = popularity / max(popularity.max(), 1.0)
+        self._popular = top_k(self._popularity, per_source)
+        self._genre_popular = {}
+        # Genre code of every row, to keep candidates inside a genre
+        sizes = np.diff(engine.genre_offsets)
+        self._row_genre = np.empty(len(engine), dtype=np.int32)
+        self._row_genre[engine.genre_order] = np.repeat(np.arange(len(sizes), dtype=np.int32), sizes)
+
+    # ----------------------------
+    # CANDIDATE GENERATORS
+    # ----------------------------
+
+    def _nearest(self, query, rows):
+        if len(rows) <= self.per_source:
+            return rows
+        return rows[top_k(self.engine.unit_features[rows] @ query, self.per_source)]
+
+    def _from_ann(self, query, genre):
+        rows = self.ann.probe(query, self.n_probe)
+        if genre is not None:
+            rows = rows[self._row_genre[rows] == genre]
+        return self._nearest(query, rows)
+
+    def _from_genre(self, query, genre):
+        rows = self._genre_rows(genre)
+        if len(rows) > self.GENRE_SCAN:
+            rows = rows[np.linspace(0, len(rows) - 1, self.GENRE_SCAN).astype(np.intp)]
+        return self._nearest(query, rows)
+
+    def _from_popular(self, genre):
+        if genre is None:
+            return self._popular
+        if genre not in self._genre_popular:
+            rows = self._genre_rows(genre)
+            self._genre_popular[genre] = rows[top_k(self._popularity[rows], self.per_source)]
+        return self._genre_popular[genre]
+
+    def _from_artist(self, seed):
+        return self.engine.artist_songs(seed)[:self.per_source]
+
+    def _genre_rows(self, genre):
+        offsets = self.engine.genre_offsets
+        return self.engine.genre_order[offsets[genre]:offsets[genre + 1]]
+
+    def candidates(self, query, seed=None, genre=None):
+        # {generator: rows} for a unit query. seed is the catalogue row the
+        # query came from (if any); genre is a genre code that restricts
+        # every generator when given, otherwise the seed's genre feeds the
+        # genre generator.
+        block = genre if genre is not None else (self._row_genre[seed] if seed is not None else None)
+        jobs = {
+            "ann": self._pool.submit(self._from_ann, query, genre),
+            "popular": self._pool.submit(self._from_popular, genre),
+        }
+        if block is not None:
+            jobs["genre"] = self._pool.submit(self._from_genre, query, block)
+        if seed is not None and genre is None:
+            jobs["artist"] = self._pool.submit(self._from_artist, seed)
+        return {name: job.result() for name, job in jobs.items()}
+
+    # ----------------------------
+    # RE-RANKING
+    # ----------------------------
+
+    def rerank(self, query, rows, n, exclude=None):
+        # Maximal marginal relevance: each pick maximises
+        #   cosine + popularity_weight * popularity - diversity * (closest cosine to a pick so far)
+        # Returns (rows, cosine similarity to the query) in pick order.
+        rows = np.unique(rows)
+        if exclude is not None:
+            rows = rows[rows != exclude]
+        vectors = self.engine.unit_features[rows]
+        cosine = vectors @ query
+        relevance = cosine + self.popularity_weight * self._popularity[rows]
+        n = min(n, len(rows))
+        if self.diversity == 0:
+            picked = top_k(relevance, n)
+            return rows[picked], cosine[picked]
+
+        redundancy = np.zeros(len(rows))
+        available = np.ones(len(rows), dtype=bool)
+        picked = np.empty(n, dtype=np.intp)
+        for i in range(n):
+            score = np.where(available, relevance - self.diversity * redundancy, -np.inf)
+            picked[i] = np.argmax(score)
+            available[picked[i]] = False
+            redundancy = np.maximum(redundancy, vectors @ vectors[picked[i]])
+        return rows[picked], cosine[picked]
+
+    def recommend(self, query, n, seed=None, genre=None):
+        # query is a unit vector in the engine's scaled feature space
+        found = self.candidates(query, seed, genre)
+        return self.rerank(query, np.concatenate(list(found.values())), n, exclude=seed)
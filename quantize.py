@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+
+from engine import top_k_rows
+
+# ===============================
+# REDUCED-PRECISION SCORING
+# ===============================
+# A brute-force scan over a large catalogue is limited by how many bytes of
+# features it reads, not by arithmetic. QuantizedScorer keeps the
+# unit-normalised features as
+#   float32 - half of float64, exact enough to use directly
+#   float16 - a quarter
+#   int8    - an eighth, with one scale per feature dimension
+#             (value ~= code * scale, codes in [-127, 127])
+# and scans the compact copy block by block, converting each block to
+# float32 just before its matrix product. For float16/int8 the scan keeps a
+# shortlist of the best candidates per query, which is re-scored exactly
+# against a float32 copy; only the shortlisted rows of that copy are read.
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class QuantizedScorer:
+    # Catalogue rows converted per block during the scan
+    BLOCK_ROWS = 1 << 16
+    # Shortlist = max(OVERSAMPLE * k, MIN_SHORTLIST) candidates per query
+    OVERSAMPLE = 4
+    MIN_SHORTLIST = 256
+
+    def __init__(self, precision, codes, scales=None, exact=None):
+        self.precision = precision
+        self.codes = codes
+        self.scales = scales
+        self.exact = exact
+
+    @classmethod
+    def build(cls, unit_features, precision):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose from float64, {', '.join(PRECISIONS)}")
+        exact = np.asarray(unit_features, dtype=np.float32)
+        if precision == "float32":
+            return cls(precision, exact)
+        if precision == "float16":
+            return cls(precision, exact.astype(np.float16), exact=exact)
+        scales = np.abs(exact).max(axis=0) / 127
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(exact / scales), -127, 127).astype(np.int8)
+        return cls(precision, codes, scales.astype(np.float32), exact)
+
+    @staticmethod
+    def _files(path, precision):
+        return {
+            "codes": os.path.join(path, f"quantized_{precision}.npy"),
+            "scales": os.path.join(path, f"quantized_{precision}_scales.npy"),
+            "exact": os.path.join(path, "quantized_float32.npy"),
+        }
+
+    @classmethod
+    def exists(cls, path, precision):
+        files = cls._files(path, precision)
+        return os.path.exists(files["codes"]) and os.path.exists(files["exact"])
+
+    def save(self, path):
+        files = self._files(path, self.precision)
+        np.save(files["codes"], self.codes)
+        if self.scales is not None:
+            np.save(files["scales"], self.scales)
+        if self.exact is not None:
+            np.save(files["exact"], self.exact)
+
+    @classmethod
+    def load(cls, path, precision, mmap=True):
+        files = cls._files(path, precision)
+        mode = "r" if mmap else None
+        exact = np.load(files["exact"], mmap_mode=mode)
+        if precision == "float32":
+            return cls(precision, exact)
+        scales = np.load(files["scales"]) if precision == "int8" else None
+        return cls(precision, np.load(files["codes"], mmap_mode=mode), scales, exact)
+
+    @property
+    def nbytes(self):
+        # Bytes read by a full scan
+        return self.codes.nbytes
+
+    def search(self, queries, k, rows=None):
+        # Same contract as RecommendationEngine.search(), for unit queries
+        queries = np.asarray(queries, dtype=np.float32)
+        n_rows = len(self.codes) if rows is None else len(rows)
+        k = min(k, n_rows)
+        size = k if self.exact is None else min(max(self.OVERSAMPLE * k, self.MIN_SHORTLIST), n_rows)
+        # Folding the int8 scales into the query scores the codes directly
+        weighted = queries * self.scales if self.scales is not None else queries
+
+        best = np.empty((len(queries), 0), dtype=np.intp)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n_rows, self.BLOCK_ROWS):
+            stop = min(start + self.BLOCK_ROWS, n_rows)
+            block = self.codes[start:stop] if rows is None else self.codes[rows[start:stop]]
+            scores = weighted @ block.astype(np.float32).T
+            top = top_k_rows(scores, size)
+            # Merge the block's best with the running shortlist
+            candidates = np.hstack([best, top + start])
+            candidate_scores = np.hstack([best_scores, np.take_along_axis(scores, top, axis=1)])
+            keep = top_k_rows(candidate_scores, size)
+            best = np.take_along_axis(candidates, keep, axis=1)
+            best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+
+        if rows is not None:
+            best = rows[best]
+        if self.exact is None:
+            return best, best_scores.astype(float)
+
+        # Exact float32 re-rank of the shortlist
+        exact_scores = np.einsum("qd,qsd->qs", queries, self.exact[best])
+        keep = top_k_rows(exact_scores, k)
+        return (
+            np.take_along_axis(best, keep, axis=1),
+            np.take_along_axis(exact_scores, keep, axis=1).astype(float),
+        )
@@ -33,12 +33,6 @@ df["song_clean"] = df["song"].str.lower().str.strip()
 features = df[["danceability", "energy", "tempo", "valence"]]
 scaler = StandardScaler()
 scaled_features = scaler.fit_transform(features)
-mood_mapping = {
-    "happy": {"energy": 0.8, "valence": 0.9},
-    "sad": {"energy": 0.3, "valence": 0.2},
-    "energetic": {"energy": 0.9, "valence": 0.7},
-    "chill": {"energy": 0.4, "valence": 0.5}
-}
 
 
 def recommend_similar_songs(song_name, n=5):